@@ -0,0 +1,699 @@
+import concurrent.futures
+import contextlib
+import hashlib
+import http.server
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image
+from PyPDF2 import PageObject, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+import main
+
+RESULTS_FILE = "benchmark_results.jsonl"
+SUITE_SIZES = (10, 1000, 20000)
+
+# Catalog id prefixes per category, as they appear in fortnite-api.com ids.
+SYNTHETIC_PREFIXES = {
+    "AthenaCharacter": "CID",
+    "AthenaBackpack": "BID",
+    "AthenaPickaxe": "Pickaxe_ID",
+    "AthenaGlider": "Glider_ID",
+    "AthenaSkyDiveContrail": "Trails_ID",
+    "AthenaDance": "EID",
+    "AthenaMusicPack": "MusicPack",
+    "AthenaItemWrap": "Wrap",
+}
+SYNTHETIC_WORDS = (
+    "alpha brave cobalt drift ember frost glimmer havoc ion jolt karma lunar mystic nova "
+    "onyx pulse quake raven storm titan umbra venom warp xeno yonder zephyr"
+).split()
+SYNTHETIC_RARITIES = ("common", "uncommon", "rare", "epic", "legendary", "marvel", "icon")
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def load_catalog_json():
+    with open(main.CATALOG_FILE, "r") as f:
+        cosmetics_data = json.load(f)
+    return cosmetics_data.get("data", []), None
+
+
+def load_catalog_compact():
+    compact = main.load_compact_catalog()
+    if compact is None:
+        raise RuntimeError(f"{main.COMPACT_CATALOG_FILE} is missing or stale")
+    _, items, aliases = compact
+    return items, aliases["normalized_names"]
+
+
+CATALOG_LOADERS = {
+    "json": load_catalog_json,
+    "compact": load_catalog_compact,
+}
+
+
+def catalog_load_child(mode):
+    start = time.perf_counter()
+    items, normalized_names = CATALOG_LOADERS[mode]()
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    main.build_lookups(items, normalized_names)
+    lookup_time = time.perf_counter() - start
+
+    print(json.dumps({
+        "mode": mode,
+        "items": len(items),
+        "load_seconds": load_time,
+        "lookup_seconds": lookup_time,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def compare_catalog_load(repeat=3):
+    if not os.path.exists(main.CATALOG_FILE):
+        print(f"{main.CATALOG_FILE} not found, nothing to compare.")
+        return []
+
+    if main.load_compact_catalog() is None:
+        print(f"Building {main.COMPACT_CATALOG_FILE}...")
+        main.load_cosmetics_catalog()
+
+    # Every run happens in a fresh interpreter so peak RSS is per loader.
+    results = []
+    for mode in CATALOG_LOADERS:
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "catalog-load-child", mode],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'mode':<10}{'items':>8}{'load (s)':>12}{'lookups (s)':>14}{'peak RSS (MB)':>16}")
+    for mode in CATALOG_LOADERS:
+        runs = [result for result in results if result["mode"] == mode]
+        best = min(runs, key=lambda result: result["load_seconds"])
+        rss = f"{best['peak_rss_mb']:.1f}" if best["peak_rss_mb"] is not None else "n/a"
+        print(f"{mode:<10}{best['items']:>8}{best['load_seconds']:>12.3f}"
+              f"{best['lookup_seconds']:>14.3f}{rss:>16}")
+
+    return results
+
+
+class StubImageServer:
+    def __init__(self, latency=0.0, error_rate=0.0, image_size=256, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.image_size = image_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.images = {}
+        self.requests = 0
+        self.errors = 0
+        self.server = None
+
+    def render_icon(self, path):
+        with self.lock:
+            if path in self.images:
+                return self.images[path]
+        digest = hashlib.md5(path.encode("utf-8")).digest()
+        image = Image.new("RGBA", (self.image_size, self.image_size), (0, 0, 0, 0))
+        inset = self.image_size // 8
+        image.paste((digest[0], digest[1], digest[2], 255),
+                    (inset, inset, self.image_size - inset, self.image_size - inset))
+        buffer = BytesIO()
+        image.save(buffer, format="PNG")
+        with self.lock:
+            self.images[path] = buffer.getvalue()
+        return self.images[path]
+
+    def handler(self):
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                    fail = stub.random.random() < stub.error_rate
+                    if fail:
+                        stub.errors += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if fail:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = stub.render_icon(self.path)
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", f'"{hashlib.md5(body).hexdigest()}"')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = 0
+            self.errors = 0
+
+
+def fetch_threaded(downloader, jobs):
+    # Mirrors the per-item path: every tile downloads its own icon.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=15) as executor:
+        results = list(executor.map(lambda job: downloader.download_image(*job), jobs))
+    return sum(1 for result in results if result is not None)
+
+
+def fetch_batched(downloader, jobs):
+    for _ in downloader.prefetch(url for url, _ in jobs):
+        pass
+    with concurrent.futures.ThreadPoolExecutor(max_workers=15) as executor:
+        results = list(executor.map(lambda job: downloader.download_image(*job), jobs))
+    return sum(1 for result in results if result is not None)
+
+
+FETCH_MODES = {
+    "threaded": fetch_threaded,
+    "batched": fetch_batched,
+}
+
+
+def compare_image_fetch(unique_images=400, duplicate_ratio=0.25, latency=0.05, error_rate=0.02,
+                        size=(100, 100)):
+    server = StubImageServer(latency=latency, error_rate=error_rate).start()
+    try:
+        urls = [f"{server.base_url}/icons/{index}.png" for index in range(unique_images)]
+        # Pets, umbrellas and fuzzy matches make several tiles share one icon.
+        urls += random.Random(1).sample(urls, int(unique_images * duplicate_ratio))
+        jobs = [(url, size) for url in urls]
+
+        print(f"{len(jobs)} tiles, {unique_images} unique icons, "
+              f"{latency * 1000:.0f} ms latency, {error_rate:.0%} injected errors")
+        print(f"{'mode':<10}{'seconds':>10}{'images':>10}{'requests':>10}{'errors':>10}")
+
+        results = []
+        for mode, fetch in FETCH_MODES.items():
+            cache_dir = tempfile.mkdtemp(prefix=f"bench_{mode}_")
+            try:
+                downloader = main.ImageDownloader(max_workers=15, cache_dir=cache_dir)
+                server.reset_counters()
+                start = time.perf_counter()
+                images = fetch(downloader, jobs)
+                elapsed = time.perf_counter() - start
+            finally:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+
+            result = {
+                "mode": mode,
+                "seconds": elapsed,
+                "images": images,
+                "requests": server.requests,
+                "errors": server.errors,
+            }
+            results.append(result)
+            print(f"{mode:<10}{elapsed:>10.2f}{images:>10}{server.requests:>10}{server.errors:>10}")
+        return results
+    finally:
+        server.stop()
+
+
+def generate_catalog(items_per_category, base_url, seed=0):
+    rng = random.Random(seed)
+    items = []
+
+    for category, prefix in SYNTHETIC_PREFIXES.items():
+        for number in range(items_per_category):
+            words = rng.sample(SYNTHETIC_WORDS, 3)
+            name = " ".join(words[:2]).title()
+            item_id = f"{prefix}_{number:05d}_{'_'.join(words).title()}"
+            if category == "AthenaBackpack" and number % 50 == 0:
+                # The pet branch of the matcher only recognises hyphenated carrier ids.
+                item_id = f"PetCarrier-{number:05d}-{words[0].title()}"
+            elif category == "AthenaGlider" and number % 100 == 0:
+                item_id = f"Umbrella_{number:05d}_{words[0].title()}"
+
+            rarity = rng.choice(SYNTHETIC_RARITIES)
+            items.append({
+                "id": item_id,
+                "name": name,
+                "description": "Synthetic benchmark item.",
+                "type": {"value": category.replace("Athena", "").lower(), "displayValue": category,
+                         "backendValue": category},
+                "rarity": {"value": rarity, "displayValue": rarity.title(),
+                           "backendValue": f"EFortRarity::{rarity.title()}"},
+                "series": {"value": "Icon Series", "backendValue": "CreatorCollabSeries"} if number % 9 == 0 else None,
+                "set": {"value": words[2].title(), "text": f"Part of the {words[2].title()} set.",
+                        "backendValue": words[2]} if number % 3 == 0 else None,
+                "images": {
+                    "smallIcon": f"{base_url}/images/{item_id}/smallicon.png",
+                    "icon": f"{base_url}/images/{item_id}/icon.png" if number % 7 else None,
+                    "featured": None,
+                },
+                "added": "2020-01-01T00:00:00Z",
+            })
+
+    return items
+
+
+def write_catalog(path, items):
+    with open(path, "w") as f:
+        json.dump({"status": 200, "data": items}, f)
+
+
+def generate_account_ids(items, category, count, fuzzy_ratio=0.1, pet_ratio=0.02, umbrella_ratio=0.02,
+                         miss_ratio=0.02, seed=0):
+    # Ids are returned in the raw form of the account PDF; process_pdf and
+    # parse_page_text turn them into the hyphenated form of the txt files.
+    rng = random.Random(f"{seed}-{category}")
+    catalog_ids = [
+        item["id"] for item in items
+        if item["type"]["backendValue"] == category and not item["id"].startswith(("PetCarrier", "Umbrella"))
+    ]
+    pets = [item["id"] for item in items if item["id"].startswith("PetCarrier")]
+
+    special = {
+        "fuzzy": int(count * fuzzy_ratio),
+        "pet": int(count * pet_ratio) if category == "AthenaBackpack" and pets else 0,
+        "umbrella": int(count * umbrella_ratio) if category == "AthenaGlider" else 0,
+        "miss": int(count * miss_ratio),
+    }
+    owned = rng.sample(catalog_ids, min(len(catalog_ids), count - sum(special.values())))
+
+    account_ids = []
+    for item_id in owned:
+        # Epic appends a "1" to some ids; parse_page_text strips it again.
+        account_ids.append(item_id + "1" if rng.random() < 0.1 else item_id)
+    for item_id in rng.sample(owned, min(len(owned), special["fuzzy"])):
+        account_ids.append(item_id[:-2])
+    for number in range(special["pet"]):
+        account_ids.append(f"{rng.choice(pets)}_Styled{number}")
+    for number in range(special["umbrella"]):
+        account_ids.append(f"Umbrella_Season_{number:03d}_Victory")
+    for number in range(special["miss"]):
+        account_ids.append(f"{SYNTHETIC_PREFIXES[category]}_Unreleased_{number:05d}_Qxz")
+
+    # The export lists template ids in lower case (parse_page_text relies on
+    # that for the "eid-" check).
+    account_ids = [item_id.lower() for item_id in account_ids]
+    rng.shuffle(account_ids)
+    return account_ids
+
+
+def write_synthetic_pdf(path, lines, password=None, lines_per_page=60):
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+
+    for offset in range(0, len(lines), lines_per_page):
+        page = PageObject.create_blank_page(None, 612, 792)
+        content = ["BT", "/F1 9 Tf", "12 TL", "36 756 Td"]
+        for line in lines[offset:offset + lines_per_page]:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            content.append(f"({escaped}) Tj T*")
+        content.append("ET")
+        stream = DecodedStreamObject()
+        stream.set_data("\n".join(content).encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(stream)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+        })
+        writer.add_page(page)
+
+    if password:
+        writer.encrypt(password)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    # main keeps its catalog, caches and outputs relative to the current directory.
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True, capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record_results(results, path=RESULTS_FILE):
+    with open(path, "a") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+
+
+def build_tiles(index, category, item_ids):
+    tiles = []
+    for i, item_id in enumerate(item_ids):
+        item_data = index.find_item_match(item_id, category)
+        found = bool(item_data and "images" in item_data)
+        tiles.append({
+            'i': i, 'item_id': item_id, 'found': found, 'image': None,
+            'item_data': {key: item_data[key] for key in ("name", "rarity") if key in item_data} if found else None,
+            'icon_url': main.select_icon_url(item_data) if found else None,
+        })
+    return tiles
+
+
+def run_suite_size(size, latency, error_rate, password, server, workdir):
+    per_category = max(1, size // len(main.categories))
+    items = generate_catalog(max(3000, int(per_category * 1.5)), server.base_url, seed=size)
+    account_ids = {
+        category: generate_account_ids(items, category, per_category, seed=size)
+        for category in main.categories
+    }
+    lines = [f"{category}: {item_id}" for category, ids in account_ids.items() for item_id in ids]
+    random.Random(size).shuffle(lines)
+    pdf_path = os.path.join(workdir, "EpicGamesAccountData.pdf")
+    write_synthetic_pdf(pdf_path, lines, password=password)
+    write_catalog(os.path.join(workdir, main.CATALOG_FILE), items)
+
+    timings = {}
+
+    start = time.perf_counter()
+    data = main.process_pdf(pdf_path, password, output_dir=os.path.join(workdir, "extract"))
+    timings["process_pdf"] = time.perf_counter() - start
+    parsed_ids = {category: sorted(ids) for category, ids in data.items()}
+
+    start = time.perf_counter()
+    index = main.CosmeticsIndex(items)
+    timings["lookup_build"] = time.perf_counter() - start
+
+    methods = {}
+    start = time.perf_counter()
+    for category, ids in parsed_ids.items():
+        for item_id in ids:
+            method = index.resolve(item_id, category)[1]
+            methods[method] = methods.get(method, 0) + 1
+    timings["find_item_match"] = time.perf_counter() - start
+
+    tiles = {category: build_tiles(index, category, ids) for category, ids in parsed_ids.items() if ids}
+    layouts = {category: main.category_layout(len(category_tiles)) for category, category_tiles in tiles.items()}
+
+    downloader = main.ImageDownloader(max_workers=15, cache_dir=os.path.join(workdir, "fetch_cache"))
+    server.reset_counters()
+    start = time.perf_counter()
+    for _ in downloader.prefetch(tile['icon_url'] for category_tiles in tiles.values() for tile in category_tiles):
+        pass
+    with concurrent.futures.ThreadPoolExecutor(max_workers=15) as executor:
+        for category, category_tiles in tiles.items():
+            size_px = layouts[category]['thumbnail_size']
+            images = executor.map(
+                lambda tile: downloader.download_image(tile['icon_url'], (size_px, size_px)), category_tiles
+            )
+            for tile, image in zip(category_tiles, images):
+                tile['image'] = image
+    timings["fetch"] = time.perf_counter() - start
+    fetch_requests, fetch_errors = server.requests, server.errors
+
+    render_dir = os.path.join(workdir, "render")
+    os.makedirs(render_dir, exist_ok=True)
+    start = time.perf_counter()
+    for category, category_tiles in tiles.items():
+        main.render_category(category, layouts[category], category_tiles, render_dir)
+    timings["composite"] = time.perf_counter() - start
+
+    # End to end runs from a cold start: no compact catalog, caches or outputs.
+    end_to_end_dir = os.path.join(workdir, "end_to_end")
+    os.makedirs(end_to_end_dir)
+    shutil.copy(os.path.join(workdir, main.CATALOG_FILE), end_to_end_dir)
+    main.metrics.reset()
+    with working_directory(end_to_end_dir):
+        start = time.perf_counter()
+        # As in main(), ids are matched and icons downloaded while the PDF
+        # is still being parsed.
+        catalog_version, end_to_end_index, match_cache = main.load_locker_index()
+        end_to_end_downloader = main.ImageDownloader(max_workers=15, cache_dir="cosmetics_cache")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=15) as executor:
+            main.process_pdf(pdf_path, password,
+                             on_item=main.warm_locker(end_to_end_index, end_to_end_downloader, executor))
+        main.render_locker(end_to_end_index, end_to_end_downloader, catalog_version)
+        match_cache.save()
+        timings["end_to_end"] = time.perf_counter() - start
+
+    common = {
+        "benchmark": "suite",
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "size": size,
+        "tiles": sum(len(ids) for ids in parsed_ids.values()),
+        "catalog_items": len(items),
+        "latency": latency,
+        "error_rate": error_rate,
+    }
+    details = {
+        "find_item_match": {"methods": methods},
+        "fetch": {"requests": fetch_requests, "errors": fetch_errors},
+        "end_to_end": {"counters": dict(main.metrics.counters)},
+    }
+    return [
+        dict(common, stage=stage, seconds=seconds, **details.get(stage, {}))
+        for stage, seconds in timings.items()
+    ]
+
+
+def compare_alias_lookup(items_per_category=3000, ids_per_category=2000, repeat=5):
+    items = generate_catalog(items_per_category, "http://127.0.0.1", seed=1)
+    lookups = []
+    for category in main.categories:
+        account_ids = generate_account_ids(items, category, ids_per_category, seed=1)
+        lookups += main.parse_page_text("\n".join(f"{category}: {item_id}" for item_id in account_ids))
+
+    start = time.perf_counter()
+    index = main.CosmeticsIndex(items)
+    alias_build_time = time.perf_counter() - start
+    alias_count = sum(len(entries) for entries in index.aliases.values())
+
+    def chain():
+        return [index.resolve_chain(item_id.strip().lower(), category) for category, item_id in lookups]
+
+    def alias_table():
+        # resolve_uncached without the fuzzy fallback, which both paths share.
+        results = []
+        for category, item_id in lookups:
+            result = index.aliases[category].get(item_id)
+            if result is None:
+                result = index.resolve_chain(item_id.strip().lower(), category)
+            results.append(result)
+        return results
+
+    if chain() != alias_table():
+        raise RuntimeError("The alias table and the match chain disagree")
+    hits = sum(1 for category, item_id in lookups if item_id in index.aliases[category])
+
+    def best_time(function):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    normalized_names = dict(index.normalized_names)
+    results = [
+        {"mode": "chain", "seconds": best_time(chain), "per": len(lookups)},
+        {"mode": "alias table", "seconds": best_time(alias_table), "per": len(lookups)},
+        {"mode": "build_lookups", "seconds": best_time(lambda: main.build_lookups(items)), "per": len(items)},
+        {"mode": "build_lookups stored", "seconds": best_time(lambda: main.build_lookups(items, normalized_names)),
+         "per": len(items)},
+    ]
+
+    print(f"{len(lookups)} lookups against {len(items)} items, {hits} alias hits; "
+          f"{alias_count} aliases built in {alias_build_time:.2f} s")
+    print(f"{'mode':<22}{'seconds':>10}{'us each':>10}")
+    for result in results:
+        print(f"{result['mode']:<22}{result['seconds']:>10.4f}{result['seconds'] / result['per'] * 1e6:>10.2f}")
+    return results
+
+
+def compare_output_formats(tile_count=1500, repeat=2, seed=0):
+    rng = random.Random(seed)
+    layout = main.category_layout(tile_count)
+    size = layout['thumbnail_size']
+    # A few dozen distinct icons with some texture, so the encoders see
+    # something closer to real renders than flat colour.
+    icons = []
+    for _ in range(32):
+        noise = Image.frombytes("RGBA", (16, 16), bytes(rng.getrandbits(8) for _ in range(16 * 16 * 4)))
+        icons.append(noise.resize((size, size), Image.BICUBIC))
+    tiles = [
+        {
+            'i': i, 'item_id': f"cid-{i:05d}", 'found': i % 40 != 0, 'image': rng.choice(icons),
+            'item_data': {"name": " ".join(rng.sample(SYNTHETIC_WORDS, 2)).title(),
+                          "rarity": {"value": rng.choice(SYNTHETIC_RARITIES)}},
+        }
+        for i in range(tile_count)
+    ]
+
+    print(f"{tile_count} tiles, {layout['canvas_width']}x{layout['canvas_height']} px")
+    print(f"{'format':<10}{'encode (s)':>12}{'size (KB)':>12}")
+    results = []
+    output_dir = tempfile.mkdtemp(prefix="bench_output_")
+    try:
+        for output_format in main.OUTPUT_FORMATS:
+            encode_times = []
+            for _ in range(repeat):
+                render = main.render_category("AthenaCharacter", layout, tiles, output_dir, output_format)
+                encode = next(span for span in render['spans'] if span['name'] == "encode")
+                encode_times.append(encode['duration'])
+            path = os.path.join(output_dir, main.output_filename("AthenaCharacter", output_format))
+            result = {"format": output_format, "seconds": min(encode_times), "bytes": os.path.getsize(path)}
+            results.append(result)
+            print(f"{output_format:<10}{result['seconds']:>12.3f}{result['bytes'] / 1024:>12.0f}")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return results
+
+
+def time_locker_queries(items_per_category=3000, ids_per_category=2000, repeat=5):
+    items = generate_catalog(items_per_category, "http://127.0.0.1", seed=2)
+    cache_dir = tempfile.mkdtemp(prefix="bench_query_")
+    match_cache = main.MatchCache("benchmark", path=os.path.join(cache_dir, main.MATCH_CACHE_FILE))
+    index = main.CosmeticsIndex(items, match_cache=match_cache)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def export(seed):
+        item_ids = {}
+        for category in main.categories:
+            account_ids = generate_account_ids(items, category, ids_per_category, seed=seed)
+            records = main.parse_page_text("\n".join(f"{category}: {item_id}" for item_id in account_ids))
+            item_ids[category] = sorted(item_id for _, item_id in records)
+        return item_ids
+
+    exports = [export(seed) for seed in (1, 2)]
+    other = main.Locker(exports[1], index)
+    start = time.perf_counter()
+    locker = main.Locker(exports[0], index)
+    load_time = time.perf_counter() - start
+    # Loading the export again finds its fuzzy matches in the match cache,
+    # as a query after a render does.
+    start = time.perf_counter()
+    main.Locker(exports[0], index)
+    reload_time = time.perf_counter() - start
+
+    queries = {
+        "legendary outfits": lambda: locker.items(rarity="legendary", type="AthenaCharacter"),
+        "count by rarity": lambda: locker.count("rarity"),
+        "count by set": lambda: locker.count("set", type="Backpack"),
+        "series items": lambda: locker.items(series="Icon Series"),
+        "unmatched": locker.unmatched,
+        "diff": lambda: locker.diff(other),
+    }
+    results = [
+        {"query": "load (cold)", "seconds": load_time, "results": len(locker)},
+        {"query": "load (cached)", "seconds": reload_time, "results": len(locker)},
+    ]
+    for name, query in queries.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = query()
+            timings.append(time.perf_counter() - start)
+        results.append({"query": name, "seconds": min(timings), "results": len(result)})
+
+    print(f"{len(locker)} owned items against {len(items)} catalog items")
+    print(f"{'query':<20}{'ms':>10}{'results':>10}")
+    for result in results:
+        print(f"{result['query']:<20}{result['seconds'] * 1000:>10.2f}{result['results']:>10}")
+    return results
+
+
+def run_suite(sizes=SUITE_SIZES, latency=0.01, error_rate=0.005, password="benchmark",
+              results_path=RESULTS_FILE):
+    server = StubImageServer(latency=latency, error_rate=error_rate).start()
+    all_results = []
+    try:
+        for size in sizes:
+            workdir = tempfile.mkdtemp(prefix=f"bench_suite_{size}_")
+            try:
+                results = run_suite_size(size, latency, error_rate, password, server, workdir)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            all_results.extend(results)
+    finally:
+        server.stop()
+
+    print(f"\n{'size':>8}{'tiles':>8}{'stage':>18}{'seconds':>10}")
+    for result in all_results:
+        print(f"{result['size']:>8}{result['tiles']:>8}{result['stage']:>18}{result['seconds']:>10.3f}")
+
+    record_results(all_results, results_path)
+    print(f"Results appended to {results_path}")
+    return all_results
+
+
+BENCHMARKS = {
+    "catalog-load": compare_catalog_load,
+    "image-fetch": compare_image_fetch,
+    "alias-lookup": compare_alias_lookup,
+    "output-format": compare_output_formats,
+    "query": time_locker_queries,
+    "suite": run_suite,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "catalog-load-child":
+        catalog_load_child(sys.argv[2])
+    elif len(sys.argv) > 2 and sys.argv[1] == "suite":
+        run_suite(sizes=[int(size) for size in sys.argv[2:]])
+    elif len(sys.argv) > 1:
+        BENCHMARKS[sys.argv[1]]()
+    else:
+        for benchmark in BENCHMARKS.values():
+            benchmark()
@@ -1,18 +1,26 @@
-import concurrent.futures
-import difflib
+import argparse
+import contextlib
+import gc
+import hashlib
+import heapq
 import json
 import math
 import os
+import queue
+import random
 import re
+import struct
+import sys
 import threading
+import zlib
 import time
 import traceback
 from io import BytesIO
+from urllib.parse import urlparse
 
-import requests
-from PIL import Image, ImageDraw, ImageFont
-from PyPDF2 import PdfReader
-from unidecode import unidecode
+# requests, Pillow, PyPDF2, unidecode, difflib, sqlite3 and
+# concurrent.futures are imported inside the functions that use them, so
+# commands that need only some of them start quickly.
 
 categories = {
     "AthenaCharacter": "AthenaCharacter.txt",
@@ -27,472 +35,2626 @@ categories = {
 
 pattern = re.compile(r"(\bAthena\w+):\s*(.+)", re.IGNORECASE)
 
+COSMETICS_API_URL = "https://fortnite-api.com/v2/cosmetics/br"
+CATALOG_FILE = "fortnite_cosmetics.json"
+PDF_PAGES_PER_CHUNK = 8
+IMAGE_CACHE_DIR = "cosmetics_cache"
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Name of a resized icon in caches written before the sqlite index: the URL
+# with non-word characters replaced, then the size.
+LEGACY_CACHE_FILE = re.compile(r"^https?_\w+_\d+x\d+\.png$")
+# Every icon is cached once at these sizes; tiles are scaled down from the
+# closest level that is at least as large (category layouts use 60-150 px).
+PYRAMID_LEVELS = (256, 128, 64)
+BUILD_MANIFEST_FILE = "build_manifest.json"
+LOCKER_MANIFEST_FILE = "locker.json"
+LOCKER_HTML_FILE = "locker.html"
+STREAMING_THRESHOLD = 1500
+MATCH_CACHE_FILE = "match_cache.json"
+MATCH_REPORT_FILE = "match_report.json"
+CATALOG_META_FILE = "fortnite_cosmetics.meta.json"
+COMPACT_CATALOG_FILE = "fortnite_cosmetics.bin"
+
+# Compact catalog layout: a header, one fixed-size record per item holding
+# indexes into a table of unique strings, the alias table, then the NUL
+# separated string table. The alias table holds an alias count per category
+# followed by three columns (alias string, item record, match method), each
+# grouped by category so a whole category unpacks in one call. has_images is
+# a flag, not a string index: items without an images key stay without one.
+COMPACT_MAGIC = b"FNLKCAT4"
+COMPACT_HEADER = struct.Struct("<8s40sQQIIII")
+COMPACT_FIELDS = (
+    "id", "type", "name", "rarity", "set", "series",
+    "icon", "smallIcon", "featured", "lego_large", "lego_small",
+    "normalized_name", "has_images",
+)
+COMPACT_RECORD = struct.Struct("<" + "i" * len(COMPACT_FIELDS))
+ALIAS_METHODS = ("exact", "pet", "prefix", "variant", "umbrella")
+
+# Upper bounds (milliseconds) of the HTTP latency histogram buckets.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self.lock:
+            self.origin = time.time()
+            self.spans = []
+            self.events = []
+            self.counters = {}
+            self.histograms = {}
+    
+    @staticmethod
+    def span_record(name, start, end, **args):
+        # Built without touching the recorder so worker processes can hand
+        # their timings back to the parent inside a result.
+        return {
+            "name": name,
+            "start": start,
+            "end": end,
+            "duration": end - start,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "args": args,
+        }
+    
+    def add_spans(self, records):
+        with self.lock:
+            self.spans.extend(records)
+    
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        record = self.span_record(name, time.time(), time.time(), **args)
+        try:
+            yield record
+        except Exception as e:
+            record["args"]["error"] = repr(e)
+            raise
+        finally:
+            record["end"] = time.time()
+            record["duration"] = record["end"] - record["start"]
+            self.add_spans([record])
+    
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+    
+    def observe(self, name, value_ms):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = {
+                    "count": 0, "sum": 0.0, "min": value_ms, "max": value_ms,
+                    "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+            histogram["count"] += 1
+            histogram["sum"] += value_ms
+            histogram["min"] = min(histogram["min"], value_ms)
+            histogram["max"] = max(histogram["max"], value_ms)
+            bucket = 0
+            while bucket < len(LATENCY_BUCKETS_MS) and value_ms > LATENCY_BUCKETS_MS[bucket]:
+                bucket += 1
+            histogram["buckets"][bucket] += 1
+    
+    def error(self, stage, message, **args):
+        self.count(f"errors.{stage}")
+        with self.lock:
+            self.events.append({
+                "name": "error",
+                "time": time.time(),
+                "pid": os.getpid(),
+                "thread": threading.current_thread().name,
+                "args": dict(args, stage=stage, message=str(message)),
+            })
+    
+    def drain(self):
+        with self.lock:
+            snapshot = {
+                "spans": self.spans,
+                "events": self.events,
+                "counters": self.counters,
+                "histograms": self.histograms,
+            }
+        self.reset()
+        return snapshot
+    
+    def merge(self, snapshot):
+        with self.lock:
+            self.spans.extend(snapshot["spans"])
+            self.events.extend(snapshot["events"])
+            for name, value in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, other in snapshot["histograms"].items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    self.histograms[name] = other
+                    continue
+                histogram["count"] += other["count"]
+                histogram["sum"] += other["sum"]
+                histogram["min"] = min(histogram["min"], other["min"])
+                histogram["max"] = max(histogram["max"], other["max"])
+                histogram["buckets"] = [a + b for a, b in zip(histogram["buckets"], other["buckets"])]
+    
+    def histogram_lines(self):
+        labels = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["le_inf"]
+        lines = []
+        for name, histogram in sorted(self.histograms.items()):
+            lines.append({
+                "type": "histogram",
+                "name": name,
+                "count": histogram["count"],
+                "mean_ms": histogram["sum"] / histogram["count"],
+                "min_ms": histogram["min"],
+                "max_ms": histogram["max"],
+                "buckets": dict(zip(labels, histogram["buckets"])),
+            })
+        return lines
+    
+    def export_jsonl(self, path):
+        with self.lock:
+            lines = [dict(record, type="span") for record in sorted(self.spans, key=lambda s: s["start"])]
+            lines += [dict(event, type="event") for event in self.events]
+            lines += [
+                {"type": "counter", "name": name, "value": value}
+                for name, value in sorted(self.counters.items())
+            ]
+            lines += self.histogram_lines()
+        with open(path, "w") as f:
+            for line in lines:
+                f.write(json.dumps(line) + "\n")
+    
+    def export_chrome_trace(self, path):
+        # Trace Event Format, loadable in chrome://tracing or Perfetto.
+        thread_ids = {}
+        
+        def micros(timestamp):
+            return round((timestamp - self.origin) * 1e6)
+        
+        def tid(record):
+            return thread_ids.setdefault((record["pid"], record["thread"]), len(thread_ids) + 1)
+        
+        with self.lock:
+            trace_events = [
+                {
+                    "name": record["name"], "ph": "X", "ts": micros(record["start"]),
+                    "dur": round(record["duration"] * 1e6), "pid": record["pid"],
+                    "tid": tid(record), "args": record["args"],
+                }
+                for record in self.spans
+            ]
+            trace_events += [
+                {
+                    "name": event["name"], "ph": "i", "s": "t", "ts": micros(event["time"]),
+                    "pid": event["pid"], "tid": tid(event), "args": event["args"],
+                }
+                for event in self.events
+            ]
+            end = max([event["ts"] + event.get("dur", 0) for event in trace_events] or [0])
+            trace_events += [
+                {"name": "thread_name", "ph": "M", "pid": pid, "tid": number, "args": {"name": thread}}
+                for (pid, thread), number in thread_ids.items()
+            ]
+            trace_events += [
+                {"name": name, "ph": "C", "ts": end, "pid": os.getpid(), "args": {"value": value}}
+                for name, value in sorted(self.counters.items())
+            ]
+            trace = {
+                "traceEvents": trace_events,
+                "displayTimeUnit": "ms",
+                "otherData": {"histograms": self.histogram_lines()},
+            }
+        with open(path, "w") as f:
+            json.dump(trace, f)
+
+
+metrics = Metrics()
+
+
+_pyramid_format = None
+
+
+def pyramid_format():
+    # Lossy WebP keeps the alpha channel lossless, is about a third of the
+    # size of PNG for icons and encodes several times faster. Pillow builds
+    # without libwebp fall back to a fast PNG preset.
+    global _pyramid_format
+    if _pyramid_format is None:
+        from PIL import features
+        
+        if features.check("webp"):
+            _pyramid_format = ("webp", {"format": "WEBP", "quality": 90, "method": 0})
+        else:
+            _pyramid_format = ("png", {"format": "PNG", "compress_level": 1})
+    return _pyramid_format
+
+
+def pyramid_level(size):
+    # The smallest level that still covers the tile, or None when the tile
+    # is larger than the pyramid and has to come from the original.
+    for level in reversed(PYRAMID_LEVELS):
+        if level >= max(size):
+            return level
+    return None
+
+
+def scale_icon(image, size):
+    from PIL import Image
+    
+    if image.size == tuple(size):
+        return image
+    # reducing_gap shrinks by whole factors first (a cheap box reduce) and
+    # leaves less than 2x to the bicubic pass, so large originals scale fast.
+    return image.resize(size, Image.BICUBIC, reducing_gap=2.0)
+
+
+class ImageCache:
+    def __init__(self, cache_dir="image_cache", max_bytes=IMAGE_CACHE_MAX_BYTES):
+        import sqlite3
+        
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.counters = {
+            "pyramid_hits": 0,
+            "original_hits": 0,
+            "misses": 0,
+            "offline_misses": 0,
+            "evictions": 0,
+        }
+        
+        index_path = os.path.join(cache_dir, "index.sqlite")
+        if os.path.isdir(cache_dir) and not os.path.exists(index_path):
+            self._remove_legacy_files()
+        for subdir in ("originals", "pyramid"):
+            os.makedirs(os.path.join(cache_dir, subdir), exist_ok=True)
+        
+        self.index = sqlite3.connect(index_path, check_same_thread=False)
+        self.index.execute("PRAGMA journal_mode=WAL")
+        self.index.execute("PRAGMA synchronous=NORMAL")
+        self.index.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "path TEXT PRIMARY KEY, url TEXT, kind TEXT, "
+            "size INTEGER, last_access REAL, etag TEXT)"
+        )
+        self._remove_legacy_thumbnails()
+        self.index.commit()
+        self.total_bytes = self.index.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+    
+    def _remove_legacy_thumbnails(self):
+        # Before the pyramid, every (url, size) pair had its own PNG under
+        # thumbnails/.
+        rows = self.index.execute("SELECT path FROM entries WHERE kind = 'thumbnail'").fetchall()
+        for (path,) in rows:
+            try:
+                os.remove(os.path.join(self.cache_dir, path))
+            except OSError:
+                pass
+        self.index.execute("DELETE FROM entries WHERE kind = 'thumbnail'")
+        try:
+            os.rmdir(os.path.join(self.cache_dir, "thumbnails"))
+        except OSError:
+            pass
+    
+    def _remove_legacy_files(self):
+        # Older versions stored one resized PNG per (url, size) directly in
+        # the cache directory, which is what let the cache grow unbounded.
+        # Only runs before the index exists and only touches files named the
+        # way those versions named them, since --cache-dir can point anywhere.
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if LEGACY_CACHE_FILE.match(name) and os.path.isfile(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    @staticmethod
+    def url_key(url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+    
+    def original_path(self, url):
+        return os.path.join("originals", self.url_key(url))
+    
+    def level_path(self, url, level):
+        return os.path.join("pyramid", f"{self.url_key(url)}_{level}.{pyramid_format()[0]}")
+    
+    def _touch(self, path):
+        with self.lock:
+            row = self.index.execute(
+                "SELECT 1 FROM entries WHERE path = ?", (path,)
+            ).fetchone()
+            if row is None or not os.path.exists(os.path.join(self.cache_dir, path)):
+                return False
+            self.index.execute(
+                "UPDATE entries SET last_access = ? WHERE path = ?", (time.time(), path)
+            )
+            self.index.commit()
+            return True
+    
+    def _record(self, paths, url, kind, etag=None):
+        # Files that belong together (the levels of one pyramid) share a
+        # single commit.
+        sizes = [(path, os.path.getsize(os.path.join(self.cache_dir, path))) for path in paths]
+        with self.lock:
+            for path, size in sizes:
+                previous = self.index.execute(
+                    "SELECT size FROM entries WHERE path = ?", (path,)
+                ).fetchone()
+                if previous:
+                    self.total_bytes -= previous[0]
+                self.index.execute(
+                    "INSERT OR REPLACE INTO entries (path, url, kind, size, last_access, etag) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, url, kind, size, time.time(), etag),
+                )
+                self.total_bytes += size
+            self._evict()
+            self.index.commit()
+    
+    def _evict(self):
+        # Rows whose file could not be removed stay at the front of the
+        # order, so later passes skip past them instead of retrying forever.
+        skipped = 0
+        while self.total_bytes > self.max_bytes:
+            rows = self.index.execute(
+                "SELECT path, size FROM entries ORDER BY last_access, path LIMIT 64 OFFSET ?",
+                (skipped,),
+            ).fetchall()
+            if not rows:
+                break
+            for path, size in rows:
+                try:
+                    os.remove(os.path.join(self.cache_dir, path))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    # Still open elsewhere (Windows); try again on a later eviction.
+                    skipped += 1
+                    continue
+                self.index.execute("DELETE FROM entries WHERE path = ?", (path,))
+                self.total_bytes -= size
+                self.counters["evictions"] += 1
+                metrics.count("cache.evictions")
+                if self.total_bytes <= self.max_bytes:
+                    break
+    
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+        metrics.count(f"cache.{counter}")
+    
+    def get_level(self, url, level):
+        from PIL import Image
+        
+        path = self.level_path(url, level)
+        if not self._touch(path):
+            return None
+        # Decoded here, on the fetch thread, so compositing never waits on it.
+        try:
+            with Image.open(os.path.join(self.cache_dir, path)) as image:
+                image.load()
+        except Exception:
+            return None
+        self._count("pyramid_hits")
+        return image
+    
+    def has_level(self, url, level):
+        return self._touch(self.level_path(url, level))
+    
+    def has_original(self, url):
+        return self._touch(self.original_path(url))
+    
+    def get_original(self, url):
+        path = self.original_path(url)
+        if not self._touch(path):
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, path), "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+        self._count("original_hits")
+        return content
+    
+    def put_original(self, url, content, etag=None):
+        path = self.original_path(url)
+        full_path = os.path.join(self.cache_dir, path)
+        temp_path = f"{full_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, full_path)
+        self._record([path], url, "original", etag)
+    
+    def put_levels(self, url, images):
+        from PIL import Image
+        
+        # Returns the levels decoded from the bytes just written, so a tile
+        # drawn on a miss has the same pixels as one drawn from a later hit.
+        paths = []
+        decoded = {}
+        for level, image in images.items():
+            path = self.level_path(url, level)
+            full_path = os.path.join(self.cache_dir, path)
+            temp_path = f"{full_path}.{threading.get_ident()}.tmp"
+            buffer = BytesIO()
+            image.save(buffer, **pyramid_format()[1])
+            with open(temp_path, "wb") as f:
+                f.write(buffer.getvalue())
+            os.replace(temp_path, full_path)
+            paths.append(path)
+            buffer.seek(0)
+            with Image.open(buffer) as stored:
+                stored.load()
+            decoded[level] = stored
+        self._record(paths, url, "pyramid")
+        return decoded
+    
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["bytes"] = self.total_bytes
+            stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+class HostRateLimiter:
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0
+        self.lock = threading.Lock()
+        self.next_slot = {}
+    
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class BulkFetcher:
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    
+    def __init__(self, session, concurrency=16, max_retries=3, backoff=0.5,
+                 timeout=10, per_host_rate=None):
+        from requests.adapters import HTTPAdapter
+        
+        self.session = session
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = HostRateLimiter(per_host_rate)
+        self.retries = 0
+        
+        # Keep one warm connection per worker instead of the default pool of 10.
+        adapter = HTTPAdapter(
+            pool_connections=concurrency, pool_maxsize=concurrency
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+    
+    def fetch_one(self, url):
+        import requests
+        
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait(url)
+            retry_after = None
+            request_start = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                metrics.observe("http.fetch_ms", (time.perf_counter() - request_start) * 1000)
+                metrics.count(f"http.status.{response.status_code}")
+                if response.status_code not in self.RETRY_STATUS:
+                    response.raise_for_status()
+                    metrics.count("http.bytes_downloaded", len(response.content))
+                    return url, response.content, response.headers.get("ETag"), None
+                error = requests.HTTPError(f"{response.status_code} for {url}")
+                retry_after = response.headers.get("Retry-After")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.observe("http.fetch_ms", (time.perf_counter() - request_start) * 1000)
+                metrics.count("http.connection_errors")
+                error = e
+            except requests.RequestException as e:
+                return url, None, None, e
+            
+            if attempt == self.max_retries:
+                break
+            with self.rate_limiter.lock:
+                self.retries += 1
+            metrics.count("http.retries")
+            delay = self.backoff * (2 ** attempt) * (1 + random.random() / 2)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            time.sleep(delay)
+        
+        return url, None, None, error
+    
+    def fetch(self, urls):
+        import concurrent.futures
+        
+        unique_urls = list(dict.fromkeys(url for url in urls if url))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self.fetch_one, url) for url in unique_urls]
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+
 
 class ImageDownloader:
-    def __init__(self, max_workers=10, cache_dir="image_cache"):
+    def __init__(self, max_workers=10, cache_dir="image_cache", max_cache_bytes=IMAGE_CACHE_MAX_BYTES,
+                 per_host_rate=None, offline=False):
+        import requests
+        
+        # Offline downloaders only ever read the cache.
+        self.offline = offline
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         self.cache_dir = cache_dir
+        self.cache = ImageCache(cache_dir, max_bytes=max_cache_bytes)
         self.max_workers = max_workers
         self.rate_limit = threading.Semaphore(max_workers)
+        self.fetcher = BulkFetcher(self.session, concurrency=max_workers, per_host_rate=per_host_rate)
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+    
+    def prefetch(self, urls):
+        missing = []
+        for url in dict.fromkeys(url for url in urls if url):
+            if not self.cache.has_original(url):
+                missing.append(url)
         
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
+        if self.offline:
+            for url in missing:
+                yield url, False
+            return
+        
+        for url, content, etag, error in self.fetcher.fetch(missing):
+            self.cache._count("misses")
+            if content is None:
+                print(f"Error downloading {url}: {error}")
+                metrics.error("download", error, url=url)
+                yield url, False
+                continue
+            self.cache.put_original(url, content, etag)
+            yield url, True
+    
+    def fetch_original(self, url):
+        content = self.cache.get_original(url)
+        if content is not None or self.offline:
+            if content is None:
+                self.cache._count("offline_misses")
+            return content
+        
+        # Tiles that share an icon wait for the first request instead of
+        # downloading the same URL again.
+        with self.inflight_lock:
+            done = self.inflight.get(url)
+            owner = done is None
+            if owner:
+                done = self.inflight[url] = threading.Event()
+        
+        if not owner:
+            done.wait()
+            return self.cache.get_original(url)
+        
+        try:
+            self.cache._count("misses")
+            with self.rate_limit:
+                _, content, etag, error = self.fetcher.fetch_one(url)
+            if content is None:
+                print(f"Error downloading {url}: {error}")
+                metrics.error("download", error, url=url)
+                return None
+            self.cache.put_original(url, content, etag)
+            return content
+        finally:
+            with self.inflight_lock:
+                del self.inflight[url]
+            done.set()
+    
+    def warm(self, url):
+        # Downloads an icon ahead of rendering. The tile size is not known
+        # yet, so only the original is fetched, and only if nothing for the
+        # URL is cached.
+        if self.offline or self.cache.has_original(url):
+            return
+        if any(self.cache.has_level(url, level) for level in PYRAMID_LEVELS):
+            return
+        self.fetch_original(url)
+    
+    def build_pyramid(self, url, levels=PYRAMID_LEVELS):
+        from PIL import Image
+        
+        content = self.fetch_original(url)
+        if content is None:
+            return None
+        
+        try:
+            with Image.open(BytesIO(content)) as original:
+                # JPEG originals decode straight at a reduced scale; for PNG
+                # this is a no-op.
+                original.draft("RGB", (PYRAMID_LEVELS[0], PYRAMID_LEVELS[0]))
+                original.load()
+                if original.mode not in ("RGB", "RGBA"):
+                    original = original.convert("RGBA")
+            
+            # Every level is scaled down the same chain, whichever of them
+            # are missing, so a rebuilt level matches the one it replaces.
+            images = {}
+            previous = original
+            for level in PYRAMID_LEVELS:
+                if not levels or level < min(levels):
+                    break
+                if previous.size == (level * 2, level * 2):
+                    previous = previous.reduce(2)
+                else:
+                    previous = scale_icon(previous, (level, level))
+                if level in levels:
+                    images[level] = previous
+            return original, self.cache.put_levels(url, images)
+        except Exception as e:
+            print(f"Error decoding {url}: {e}")
+            metrics.error("decode", e, url=url)
+            return None
+    
+    def missing_levels(self, url, levels):
+        return [level for level in levels if not self.cache.has_level(url, level)]
+    
+    def ensure_pyramid(self, url):
+        missing = self.missing_levels(url, PYRAMID_LEVELS)
+        if not missing:
+            return True
+        return self.build_pyramid(url, missing) is not None
     
     def download_image(self, url, size):
         if not url:
             return None
+        
+        level = pyramid_level(size)
+        if level is not None:
+            image = self.cache.get_level(url, level)
+            if image is not None:
+                return scale_icon(image, size)
+        
+        # Decoding the original is the expensive part, so every missing level
+        # up to the covering one is built from the same decode. Larger levels
+        # cost the most to encode and are left to prefetch or a larger tile.
+        smaller = [other for other in PYRAMID_LEVELS if level is not None and other < level]
+        missing = ([level] if level is not None else []) + self.missing_levels(url, smaller)
+        pyramid = self.build_pyramid(url, missing)
+        if pyramid is None:
+            return None
+        original, images = pyramid
+        return scale_icon(images[level] if level is not None else original, size)
+
+
+def normalize_string(s):
+    from unidecode import unidecode
+    
+    if not s:
+        return ""
+    return re.sub(r'[^a-z0-9]', '', unidecode(s).lower())
+
+
+def trigrams(s):
+    padded = f"  {s} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyIndex:
+    def __init__(self, lookup, min_length=3, candidate_limit=20):
+        self.lookup = lookup
+        self.keys = [key for key in lookup if len(key) >= min_length]
+        self.candidate_limit = candidate_limit
+        self.postings = {}
+        
+        for position, key in enumerate(self.keys):
+            for gram in trigrams(re.sub(r'[^a-z0-9]', '', key)):
+                self.postings.setdefault(gram, []).append(position)
+        
+        # Trigrams shared by a large part of the category (e.g. "cid", "ath")
+        # carry almost no signal and would make every query touch every key.
+        self.common_threshold = max(50, len(self.keys) // 4)
+    
+    def candidates(self, query):
+        scores = {}
+        common_postings = []
+        
+        for gram in trigrams(query):
+            posting = self.postings.get(gram)
+            if not posting:
+                continue
+            if len(posting) > self.common_threshold:
+                common_postings.append(posting)
+                continue
+            for position in posting:
+                scores[position] = scores.get(position, 0) + 1
+        
+        if not scores:
+            for posting in common_postings:
+                for position in posting:
+                    scores[position] = scores.get(position, 0) + 1
+        
+        best = heapq.nlargest(self.candidate_limit, scores, key=scores.get)
+        return [self.keys[position] for position in sorted(best)]
+    
+    def best_match(self, query, cutoff=0.65):
+        import difflib
+        
+        best_match = None
+        best_score = cutoff
+        
+        for key in self.candidates(query):
+            matcher = difflib.SequenceMatcher(None, query, key)
+            if (matcher.real_quick_ratio() > best_score
+                    and matcher.quick_ratio() > best_score):
+                similarity = matcher.ratio()
+                if similarity > best_score:
+                    best_score = similarity
+                    best_match = self.lookup[key]
+        
+        return best_match
+
+
+def parse_page_text(text):
+    records = []
+    for category, details in pattern.findall(text):
+        if category in categories:
+            filtered_details = re.sub(r'1$', '', details.strip())
+            filtered_details = filtered_details.replace('_', '-')
+            
+            if category == "AthenaDance" and not filtered_details.startswith("eid-"):
+                continue
+            
+            records.append((category, filtered_details))
+    return records
+
+
+def open_pdf(file_path, password=None):
+    from PyPDF2 import PdfReader
+    
+    reader = PdfReader(file_path)
+    
+    if reader.is_encrypted:
+        if not password:
+            raise ValueError("Password is required for encrypted PDF.")
+        if not reader.decrypt(password):
+            raise ValueError("Incorrect password for encrypted PDF.")
+    
+    return reader
+
+
+_pdf_worker_reader = None
+
+
+def _init_pdf_worker(file_path, password):
+    # Each worker process opens and decrypts the PDF once, not once per page.
+    global _pdf_worker_reader
+    _pdf_worker_reader = open_pdf(file_path, password)
+
+
+def _extract_pdf_pages(page_numbers):
+    records = []
+    for page_number in page_numbers:
+        records.extend(parse_page_text(_pdf_worker_reader.pages[page_number].extract_text()))
+    return records
+
+
+def iter_pdf_items(file_path, password=None, reader=None, jobs=None):
+    if reader is None:
+        reader = open_pdf(file_path, password)
+    
+    page_count = len(reader.pages)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, math.ceil(page_count / PDF_PAGES_PER_CHUNK))
+    
+    if jobs <= 1:
+        for page in reader.pages:
+            yield from parse_page_text(page.extract_text())
+        return
+    
+    import concurrent.futures
+    
+    chunks = [
+        range(start, min(start + PDF_PAGES_PER_CHUNK, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_CHUNK)
+    ]
+    
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_pdf_worker,
+        initargs=(file_path, password),
+    ) as executor:
+        futures = [executor.submit(_extract_pdf_pages, chunk) for chunk in chunks[1:]]
+        
+        # The workers need a moment to start and open the PDF, so the first
+        # chunk comes straight from the reader that is already decrypted.
+        for page_number in chunks[0]:
+            yield from parse_page_text(reader.pages[page_number].extract_text())
+        
+        for future in concurrent.futures.as_completed(futures):
+            yield from future.result()
+
+
+def process_pdf(file_path, password=None, reader=None, jobs=None, output_dir=".", on_item=None):
+    # on_item(category, item_id) sees each record as soon as its page is
+    # parsed; the txt files are written once the whole PDF is read.
+    try:
+        data = {key: [] for key in categories}
+        
+        with metrics.span("pdf_parse", file=os.path.basename(file_path)) as span:
+            for category, item_id in iter_pdf_items(file_path, password, reader=reader, jobs=jobs):
+                data[category].append(item_id)
+                if on_item is not None:
+                    on_item(category, item_id)
+            span["args"]["items"] = sum(len(ids) for ids in data.values())
+
+        changed = 0
+        os.makedirs(output_dir, exist_ok=True)
+        for category, filename in categories.items():
+            filename = os.path.join(output_dir, filename)
+            content = "\n".join(sorted(data[category]))
+            if os.path.exists(filename):
+                with open(filename, "r") as f:
+                    if f.read() == content:
+                        continue
+            with open(filename, "w") as f:
+                f.write(content)
+            changed += 1
+        
+        print(f"Processing complete. {changed} of {len(categories)} category files changed.")
+        return data
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        metrics.error("pdf_parse", e, file=file_path)
+        return None
+
+
+def load_catalog_meta():
+    if not os.path.exists(CATALOG_META_FILE):
+        return {}
+    try:
+        with open(CATALOG_META_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_catalog_meta(meta):
+    with open(CATALOG_META_FILE, "w") as f:
+        json.dump(meta, f, indent=4)
+
+
+def merge_cosmetics(existing_items, new_items):
+    merged = list(existing_items)
+    positions = {}
+    for position, item in enumerate(merged):
+        if isinstance(item, dict) and "id" in item:
+            positions[item["id"]] = position
+    
+    added = 0
+    changed = 0
+    for item in new_items:
+        if not (isinstance(item, dict) and "id" in item):
+            continue
+        position = positions.get(item["id"])
+        if position is None:
+            positions[item["id"]] = len(merged)
+            merged.append(item)
+            added += 1
+        elif merged[position] != item:
+            merged[position] = item
+            changed += 1
+    
+    return merged, added, changed
+
+
+def download_fortnite_cosmetics(refresh=False, url=COSMETICS_API_URL):
+    import requests
+    
+    meta = load_catalog_meta() if refresh and os.path.exists(CATALOG_FILE) else {}
+    
+    headers = {"Accept-Encoding": "gzip"}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    
+    print("Refreshing Fortnite cosmetics data..." if meta else "Downloading Fortnite cosmetics data...")
+    download_path = CATALOG_FILE + ".download"
+    try:
+        with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+            if response.status_code == 304:
+                print("Fortnite cosmetics data is already up to date.")
+                return True
+            
+            if response.status_code != 200:
+                print(f"Error: API request failed with status code {response.status_code}")
+                print(f"Response: {response.text}")
+                return False
+            
+            # iter_content undoes the gzip transfer encoding, so the payload
+            # goes to disk in chunks instead of being held as one string.
+            with open(download_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1 << 16):
+                    f.write(chunk)
+            
+            new_meta = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+        
+        with open(download_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        new_items = data.get("data", [])
+        print(f"Successfully retrieved {len(new_items)} cosmetic items")
+        
+        if refresh and os.path.exists(CATALOG_FILE):
+            with open(CATALOG_FILE, "r", encoding="utf-8") as f:
+                local_data = json.load(f)
+            merged, added, changed = merge_cosmetics(local_data.get("data", []), new_items)
+            print(f"Catalog refresh: {added} new, {changed} changed items")
+            
+            if added or changed:
+                local_data["data"] = merged
+                with open(CATALOG_FILE, "w", encoding="utf-8") as f:
+                    json.dump(local_data, f, indent=4)
+                print(f"Data saved to {CATALOG_FILE}")
+                write_compact_catalog(merged, file_sha1(CATALOG_FILE))
+            os.remove(download_path)
+        else:
+            with open(CATALOG_FILE, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=4)
+            os.remove(download_path)
+            print(f"Data saved to {CATALOG_FILE}")
+            write_compact_catalog(new_items, file_sha1(CATALOG_FILE))
+        
+        save_catalog_meta(new_meta)
+        return True
+    
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+        if os.path.exists(download_path):
+            os.remove(download_path)
+        return False
+
+
+def ensure_cosmetics_data(refresh=False, offline=False):
+    if offline:
+        if not os.path.exists(CATALOG_FILE):
+            print(f"{CATALOG_FILE} not found and the network is disabled.")
+            return False
+        if refresh:
+            print("Network is disabled, using existing Fortnite cosmetics data without refreshing.")
+        return True
+    
+    if not os.path.exists(CATALOG_FILE):
+        print("Fortnite cosmetics data not found. Downloading...")
+        return download_fortnite_cosmetics()
+    elif refresh:
+        return download_fortnite_cosmetics(refresh=True)
+    else:
+        print("Using existing Fortnite cosmetics data.")
+        return True
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compact_item_fields(item):
+    images = item.get("images") or {}
+    lego = images.get("lego") or {}
+    return (
+        item.get("id"),
+        (item.get("type") or {}).get("backendValue"),
+        item.get("name"),
+        (item.get("rarity") or {}).get("value"),
+        (item.get("set") or {}).get("value"),
+        (item.get("series") or {}).get("value"),
+        images.get("icon"),
+        images.get("smallIcon"),
+        images.get("featured"),
+        lego.get("large"),
+        lego.get("small"),
+    )
+
+
+@contextlib.contextmanager
+def gc_paused():
+    # Unpacking the catalog allocates a few hundred thousand small objects,
+    # none of them cyclic; letting the collector run between them roughly
+    # doubles the load time.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def write_compact_catalog(items, version, path=COMPACT_CATALOG_FILE, source_path=CATALOG_FILE, aliases=None):
+    if aliases is None:
+        aliases = CosmeticsIndex(items).alias_data()
+    normalized_names = aliases["normalized_names"]
+    
+    strings = []
+    string_index = {}
+    records = []
+    record_index = {}
+    
+    def intern(value):
+        if not isinstance(value, str):
+            return -1
+        if value not in string_index:
+            string_index[value] = len(strings)
+            strings.append(value.replace("\0", ""))
+        return string_index[value]
+    
+    for item in items:
+        if not (isinstance(item, dict) and "id" in item and "type" in item):
+            continue
+        
+        fields = compact_item_fields(item) + (normalized_names.get(item["id"].lower()),)
+        record_index[id(item)] = len(records)
+        records.append(COMPACT_RECORD.pack(*[intern(value) for value in fields], int("images" in item)))
+    
+    alias_counts = []
+    alias_strings = []
+    alias_records = []
+    alias_methods = []
+    for category in categories:
+        entries = [
+            (alias, item, method)
+            for alias, (item, method) in aliases["by_category"].get(category, {}).items()
+            if id(item) in record_index
+        ]
+        alias_counts.append(len(entries))
+        for alias, item, method in entries:
+            alias_strings.append(intern(alias))
+            alias_records.append(record_index[id(item)])
+            alias_methods.append(ALIAS_METHODS.index(method))
+    alias_count = len(alias_strings)
+    alias_table = (
+        struct.pack(f"<{len(categories)}I", *alias_counts)
+        + struct.pack(f"<{alias_count}i", *alias_strings)
+        + struct.pack(f"<{alias_count}i", *alias_records)
+        + bytes(alias_methods)
+    )
+    
+    blob = "\0".join(strings).encode("utf-8")
+    source_stat = os.stat(source_path)
+    header = COMPACT_HEADER.pack(
+        COMPACT_MAGIC, version.encode("ascii"),
+        source_stat.st_size, source_stat.st_mtime_ns,
+        len(records), alias_count, len(strings), len(blob),
+    )
+    
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header)
+        f.writelines(records)
+        f.write(alias_table)
+        f.write(blob)
+    os.replace(temp_path, path)
+    return aliases
+
+
+def load_compact_catalog(path=COMPACT_CATALOG_FILE, source_path=CATALOG_FILE):
+    if not os.path.exists(path):
+        return None
+    
+    with open(path, "rb") as f:
+        data = f.read()
+    
+    if len(data) < COMPACT_HEADER.size:
+        return None
+    magic, version, source_size, source_mtime, record_count, alias_count, string_count, blob_size = \
+        COMPACT_HEADER.unpack_from(data)
+    if magic != COMPACT_MAGIC:
+        return None
+    
+    # The compact file is derived from the JSON catalog, so it is only
+    # trusted while the JSON file it was built from is unchanged.
+    if os.path.exists(source_path):
+        source_stat = os.stat(source_path)
+        if (source_stat.st_size, source_stat.st_mtime_ns) != (source_size, source_mtime):
+            return None
+    
+    records_start = COMPACT_HEADER.size
+    aliases_start = records_start + record_count * COMPACT_RECORD.size
+    blob_start = aliases_start + len(categories) * 4 + alias_count * 9
+    if len(data) != blob_start + blob_size:
+        return None
+    
+    with gc_paused():
+        strings = data[blob_start:].decode("utf-8").split("\0") if string_count else []
+        
+        items = []
+        normalized_names = {}
+        for record in COMPACT_RECORD.iter_unpack(memoryview(data)[records_start:aliases_start]):
+            (item_id, item_type, name, rarity, set_name, series, icon, small_icon, featured, lego_large, lego_small,
+             normalized_name) = [strings[index] if index >= 0 else None for index in record[:-1]]
+            if normalized_name is not None:
+                normalized_names[item_id.lower()] = normalized_name
+            
+            item = {"id": item_id, "type": {"backendValue": item_type}}
+            if name is not None:
+                item["name"] = name
+            if rarity is not None:
+                item["rarity"] = {"value": rarity}
+            if set_name is not None:
+                item["set"] = {"value": set_name}
+            if series is not None:
+                item["series"] = {"value": series}
+            
+            if record[-1]:
+                images = {"icon": icon, "smallIcon": small_icon, "featured": featured}
+                if lego_large or lego_small:
+                    images["lego"] = {"large": lego_large, "small": lego_small}
+                item["images"] = images
+            
+            items.append(item)
+        
+        alias_counts = struct.unpack_from(f"<{len(categories)}I", data, aliases_start)
+        names_start = aliases_start + len(categories) * 4
+        positions_start = names_start + alias_count * 4
+        methods_start = positions_start + alias_count * 4
+        
+        by_category = {}
+        offset = 0
+        for category, count in zip(categories, alias_counts):
+            names = struct.unpack_from(f"<{count}i", data, names_start + offset * 4)
+            positions = struct.unpack_from(f"<{count}i", data, positions_start + offset * 4)
+            methods = data[methods_start + offset:methods_start + offset + count]
+            by_category[category] = dict(zip(
+                [strings[index] for index in names],
+                zip([items[position] for position in positions], [ALIAS_METHODS[method] for method in methods]),
+            ))
+            offset += count
+        
+        aliases = {"normalized_names": normalized_names, "by_category": by_category}
+    return version.decode("ascii"), items, aliases
+
+
+def load_cosmetics_catalog():
+    compact = load_compact_catalog()
+    if compact is not None:
+        return compact
+    
+    with open(CATALOG_FILE, "rb") as f:
+        raw = f.read()
+    version = hashlib.sha1(raw).hexdigest()
+    items = json.loads(raw).get("data", [])
+    aliases = CosmeticsIndex(items).alias_data()
+    
+    try:
+        write_compact_catalog(items, version, aliases=aliases)
+    except OSError as e:
+        print(f"Could not write compact catalog: {e}")
+    
+    return version, items, aliases
+
+
+def build_lookups(items, normalized_names=None):
+    # normalized_names maps lower-case ids to normalize_string(name); it is
+    # read when given and filled in for items it does not know yet.
+    cosmetics_lookup = {}
+    type_specific_lookup = {cat: {} for cat in categories}
+    
+    for item in items:
+        if isinstance(item, dict) and "id" in item and "type" in item:
+            item_id = item["id"].lower()
+            cosmetics_lookup[item_id] = item
+            
+            item_type = item.get("type", {}).get("backendValue", "")
+            if item_type in type_specific_lookup:
+                type_specific_lookup[item_type][item_id] = item
+                
+                if "name" in item:
+                    normalized_name = normalized_names.get(item_id) if normalized_names is not None else None
+                    if normalized_name is None:
+                        normalized_name = normalize_string(item["name"])
+                        if normalized_names is not None:
+                            normalized_names[item_id] = normalized_name
+                    type_specific_lookup[item_type][normalized_name] = item
+                    
+                    if item_type == "AthenaGlider" and "umbrella" in item_id:
+                        type_specific_lookup[item_type]["umbrella"] = item
+                    
+                    if "-" in item_id:
+                        without_prefix = item_id.split("-", 1)[1]
+                        type_specific_lookup[item_type][without_prefix] = item
+    
+    return cosmetics_lookup, type_specific_lookup
+
+
+class MatchCache:
+    def __init__(self, catalog_version, path=MATCH_CACHE_FILE):
+        self.path = path
+        self.catalog_version = catalog_version
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            # Resolutions are only valid for the catalog they were made against.
+            if data.get("catalog_version") == catalog_version:
+                self.entries = data.get("entries", {})
+            else:
+                print("Cosmetics catalog changed, discarding cached item matches.")
+                self.dirty = True
+    
+    def get(self, category, item_id):
+        return self.entries.get(category, {}).get(item_id)
+    
+    def put(self, category, item_id, resolved_id, method):
+        with self.lock:
+            self.entries.setdefault(category, {})[item_id] = [resolved_id, method]
+            self.dirty = True
+    
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"catalog_version": self.catalog_version, "entries": self.entries}, f)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+
+
+class CosmeticsIndex:
+    def __init__(self, items, match_cache=None, aliases=None):
+        # aliases comes with the compact catalog: the normalized names and
+        # the alias table an earlier index built for the same items.
+        self.normalized_names = aliases["normalized_names"] if aliases else {}
+        self.cosmetics_lookup, self.type_specific_lookup = build_lookups(items, self.normalized_names)
+        self.match_cache = match_cache
+        self.fuzzy_indexes = {}
+        self.fuzzy_lock = threading.Lock()
+        # Only a handful of keys contain "petcarrier-", so pet backpacks scan
+        # those instead of the whole backpack dictionary.
+        self.pet_carriers = [
+            (id_key, item)
+            for id_key, item in self.type_specific_lookup["AthenaBackpack"].items()
+            if "petcarrier-" in id_key
+        ]
+        
+        self.aliases = aliases["by_category"] if aliases else self.build_aliases()
+    
+    def alias_data(self):
+        return {"normalized_names": self.normalized_names, "by_category": self.aliases}
+    
+    def build_aliases(self):
+        # Every spelling an account export can use for a lookup key (as is,
+        # or with the underscores parse_page_text turns into hyphens) is run
+        # through the full chain once, so matching it later is one probe.
+        aliases = {}
+        for category, lookup in self.type_specific_lookup.items():
+            entries = aliases[category] = {}
+            for key in list(lookup):
+                for alias in (key, key.replace("_", "-")):
+                    if alias in entries or alias != alias.strip():
+                        continue
+                    item, method = self.resolve_chain(alias, category)
+                    if item is not None:
+                        entries[alias] = (item, method)
+        return aliases
+    
+    def fuzzy_index(self, category):
+        with self.fuzzy_lock:
+            if category not in self.fuzzy_indexes:
+                with metrics.span("fuzzy_index_build", category=category) as span:
+                    self.fuzzy_indexes[category] = FuzzyIndex(self.type_specific_lookup[category])
+                print(f"Fuzzy index for {category} built in {span['duration']:.2f} seconds")
+            return self.fuzzy_indexes[category]
+    
+    def find_item_match(self, item_id, category):
+        return self.resolve(item_id, category)[0]
+    
+    def resolve(self, item_id, category):
+        if self.match_cache is not None:
+            cached = self.match_cache.get(category, item_id)
+            if cached is not None:
+                resolved_id, method = cached
+                if resolved_id is None:
+                    return None, method
+                item = self.cosmetics_lookup.get(resolved_id)
+                if item is not None:
+                    return item, method
+        
+        item, method = self.resolve_uncached(item_id, category)
+        
+        if self.match_cache is not None:
+            resolved_id = item["id"].lower() if item else None
+            self.match_cache.put(category, item_id, resolved_id, method)
+        return item, method
+    
+    def resolve_uncached(self, item_id, category):
+        alias = self.aliases[category].get(item_id)
+        if alias is not None:
+            return alias
+        
+        item_id = item_id.strip().lower()
+        item, method = self.resolve_chain(item_id, category)
+        if item is not None:
+            return item, method
+        
+        normalized_id = normalize_string(item_id)
+        
+        item = self.fuzzy_index(category).best_match(normalized_id)
+        return item, "fuzzy" if item else "miss"
+    
+    def resolve_chain(self, item_id, category):
+        cosmetics_lookup = self.cosmetics_lookup
+        type_specific_lookup = self.type_specific_lookup
+        
+        if item_id in cosmetics_lookup:
+            item = cosmetics_lookup[item_id]
+            if item.get("type", {}).get("backendValue", "") == category:
+                return item, "exact"
+        
+        if item_id in type_specific_lookup[category]:
+            return type_specific_lookup[category][item_id], "exact"
+        
+        if category == "AthenaBackpack" and "petcarrier-" in item_id:
+            for id_key, item in self.pet_carriers:
+                if id_key.split("petcarrier-")[1] in item_id:
+                    return item, "pet"
+                elif item_id.replace("petcarrier-", "") in id_key:
+                    return item, "pet"
+        
+        if "-" in item_id:
+            without_prefix = item_id.split("-", 1)[1]
+            if without_prefix in type_specific_lookup[category]:
+                return type_specific_lookup[category][without_prefix], "prefix"
+        
+        variation = item_id.replace("-", "_")
+        if variation in type_specific_lookup[category]:
+            return type_specific_lookup[category][variation], "variant"
+        
+        if category == "AthenaGlider" and "umbrella" in item_id:
+            if "umbrella" in type_specific_lookup[category]:
+                return type_specific_lookup[category]["umbrella"], "umbrella"
+        
+        return None, None
+
+
+def write_match_report(index, category_names, output_dir="."):
+    report = {}
+    method_counts = {}
+    
+    for category in category_names:
+        entries = {}
+        for item_id in read_category_ids(category, output_dir) or []:
+            if not item_id:
+                continue
+            item, method = index.resolve(item_id, category)
+            entries[item_id] = {
+                "resolved": item["id"] if item else None,
+                "name": item.get("name") if item else None,
+                "method": method,
+            }
+            method_counts[method] = method_counts.get(method, 0) + 1
+        report[category] = entries
+    
+    path = os.path.join(output_dir, MATCH_REPORT_FILE)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=4)
+    
+    summary = ", ".join(f"{count} {method}" for method, count in sorted(method_counts.items()))
+    print(f"Match report written to {path}: {summary or 'no items'}")
+    return report
+
+
+def read_category_ids(category, output_dir="."):
+    path = os.path.join(output_dir, f"{category}.txt")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return [line.strip() for line in f.read().strip().split("\n")]
+
+
+def select_icon_url(item_data):
+    images = item_data.get("images") or {}
+    for img_key in ["icon", "smallIcon", "featured"]:
+        if img_key in images and images[img_key]:
+            return images[img_key]
+    
+    if "lego" in images:
+        for lego_key in ["large", "small"]:
+            if lego_key in images["lego"] and images["lego"][lego_key]:
+                return images["lego"][lego_key]
+    
+    return None
+
+
+def category_layout(item_count):
+    cols = math.ceil(math.sqrt(item_count * 1.5))
+    rows = math.ceil(item_count / cols)
+    
+    thumbnail_size = max(60, min(150, int(900 / cols)))
+    horizontal_spacing = max(8, thumbnail_size // 10)
+    vertical_spacing = max(40, thumbnail_size // 2)
+    text_height = max(16, thumbnail_size // 6)
+    
+    margin = 60
+    font_size = max(12, thumbnail_size // 8)
+    
+    return {
+        'item_count': item_count,
+        'cols': cols,
+        'rows': rows,
+        'thumbnail_size': thumbnail_size,
+        'horizontal_spacing': horizontal_spacing,
+        'vertical_spacing': vertical_spacing,
+        'text_height': text_height,
+        'padding': 3,
+        'margin': margin,
+        'canvas_width': margin * 2 + cols * (thumbnail_size + horizontal_spacing),
+        'canvas_height': margin * 2 + rows * (thumbnail_size + vertical_spacing + text_height),
+        'font_size': font_size,
+        'title_font_size': max(24, font_size * 1.8),
+    }
+
+
+def tile_position(layout, i):
+    row = i // layout['cols']
+    col = i % layout['cols']
+    
+    x = layout['margin'] + col * (layout['thumbnail_size'] + layout['horizontal_spacing'])
+    y = layout['margin'] + row * (layout['thumbnail_size'] + layout['vertical_spacing'] + layout['text_height']) + 60
+    return x, y
+
+
+def load_fonts(layout):
+    from PIL import ImageFont
+    
+    try:
+        font = ImageFont.truetype("arial.ttf", layout['font_size'])
+        title_font = ImageFont.truetype("arial.ttf", layout['title_font_size'])
+    except IOError:
+        font = ImageFont.load_default()
+        title_font = ImageFont.load_default()
+    return font, title_font
+
+
+RARITY_COLORS = {
+    "common": (150, 150, 150),
+    "uncommon": (96, 170, 58),
+    "rare": (73, 172, 242),
+    "epic": (177, 91, 226),
+    "legendary": (211, 120, 65),
+    "mythic": (235, 227, 88),
+    "marvel": (197, 51, 52),
+    "dc": (84, 117, 199),
+    "icon": (63, 181, 181),
+    "starwars": (32, 85, 128),
+}
+
+CANVAS_COLOR = (25, 25, 35)
+
+# Encoder presets for the category images. "png" is Pillow's default
+# (zlib level 6); the other presets trade file size or exactness for speed.
+# Only lossless outputs are patched in place; the rest are re-rendered.
+OUTPUT_FORMATS = {
+    "png": {"extension": "png", "lossless": True, "save": {"format": "PNG"}},
+    "png-fast": {"extension": "png", "lossless": True, "save": {"format": "PNG", "compress_level": 1}},
+    "webp": {"extension": "webp", "lossless": False, "save": {"format": "WEBP", "quality": 85, "method": 2}},
+    "jpeg": {"extension": "jpg", "lossless": False, "save": {"format": "JPEG", "quality": 90}},
+}
+
+# Bump whenever drawing changes so the build manifest re-renders old outputs.
+RENDERER_VERSION = 3
+
+# Sprites are cached per process, so a composite worker reuses them across
+# every category it renders.
+_sprite_cache = {}
+
+
+def font_cache_key(font):
+    if hasattr(font, "getname"):
+        return font.getname() + (font.size,)
+    return id(font)
+
+
+def text_sprite(text, font, anchor):
+    key = ("text", text, anchor, font_cache_key(font))
+    sprite = _sprite_cache.get(key)
+    if sprite is None:
+        from PIL import Image, ImageDraw
+        
+        # Rendering the glyphs into an L mask and pasting the fill colour
+        # through it blends exactly like ImageDraw.text does on the canvas.
+        left, top, right, bottom = font.getbbox(text, anchor=anchor)
+        mask = Image.new("L", (max(0, right - left), max(0, bottom - top)), 0)
+        if mask.width and mask.height:
+            ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font, anchor=anchor)
+        sprite = _sprite_cache[key] = (mask, left, top)
+    return sprite
+
+
+def paste_text(image, xy, text, fill, font, anchor):
+    mask, left, top = text_sprite(text, font, anchor)
+    if mask.width and mask.height:
+        image.paste(fill, (xy[0] + left, xy[1] + top), mask)
+
+
+def text_length(draw, text, font):
+    key = ("length", text, font_cache_key(font))
+    length = _sprite_cache.get(key)
+    if length is None:
+        length = _sprite_cache[key] = draw.textlength(text, font=font)
+    return length
+
+
+def rarity_tile(bg_color, thumbnail_size):
+    key = ("rarity", bg_color, thumbnail_size)
+    tile = _sprite_cache.get(key)
+    if tile is None:
+        from PIL import Image, ImageDraw
+        
+        tile = Image.new('RGB', (thumbnail_size + 5, thumbnail_size + 5), (0, 0, 0))
+        ImageDraw.Draw(tile).rectangle([2, 2, thumbnail_size + 2, thumbnail_size + 2], fill=bg_color)
+        tile = _sprite_cache[key] = tile
+    return tile
+
+
+def missing_tile(thumbnail_size):
+    key = ("missing", thumbnail_size)
+    tile = _sprite_cache.get(key)
+    if tile is None:
+        from PIL import Image, ImageDraw
+        
+        tile = Image.new('RGB', (thumbnail_size + 1, thumbnail_size + 1), (50, 50, 50))
+        ImageDraw.Draw(tile).rectangle([3, 3, thumbnail_size - 3, thumbnail_size - 3], fill=(40, 40, 40))
+        tile = _sprite_cache[key] = tile
+    return tile
+
+
+def draw_tile(locker_image, draw, layout, fonts, result, origin_y=0):
+    thumbnail_size = layout['thumbnail_size']
+    padding = layout['padding']
+    font_size = layout['font_size']
+    font, title_font = fonts
+    center = thumbnail_size // 2
+    
+    x, y = tile_position(layout, result['i'])
+    y -= origin_y
+    item_id = result['item_id']
+    text_y = y + thumbnail_size + 8
+    
+    if result['found'] and result['image']:
+        item_data = result['item_data']
+        rarity = item_data.get("rarity", {}).get("value", "common")
+        bg_color = RARITY_COLORS.get(rarity, (100, 100, 100))
+        
+        locker_image.paste(rarity_tile(bg_color, thumbnail_size), (x - 2, y - 2))
+        locker_image.paste(result['image'], (x, y), mask=result['image'] if result['image'].mode == 'RGBA' else None)
+        
+        name_to_display = item_data.get("name", item_id)
+        if len(name_to_display) > thumbnail_size // 4:
+            name_to_display = name_to_display[:thumbnail_size // 4] + "..."
+        
+        text_width = text_length(draw, name_to_display, font)
+        
+        bg_rect = [
+            x + (thumbnail_size - text_width) // 2 - padding,
+            text_y - padding,
+            x + (thumbnail_size + text_width) // 2 + padding,
+            text_y + font_size + padding
+        ]
+        
+        draw.rectangle(bg_rect, fill=(0, 0, 0, 180))
+        
+        shadow_offset = 1
+        paste_text(locker_image, (x + center + shadow_offset, text_y + shadow_offset),
+                   name_to_display, (0, 0, 0), font, "mt")
+        paste_text(locker_image, (x + center, text_y), name_to_display, (255, 255, 255), font, "mt")
+        return True
+    
+    locker_image.paste(missing_tile(thumbnail_size), (x, y))
+    
+    display_name = item_id
+    if len(display_name) > 12:
+        display_name = display_name[:10] + "..."
+    
+    paste_text(locker_image, (x + center, y + center - 10), "?", (180, 180, 180), title_font, "mm")
+    paste_text(locker_image, (x + center, y + center + 15), display_name, (180, 180, 180), font, "mm")
+    
+    draw.rectangle(
+        [x, text_y, x + thumbnail_size, text_y + font_size + 6],
+        fill=(100, 30, 30)
+    )
+    paste_text(locker_image, (x + center, text_y + 3), "Not Found", (255, 200, 200), font, "mt")
+    return False
+
+
+def row_band(layout, row):
+    # Everything a row draws (borders, icons, labels) stays inside this band,
+    # so a row can be cleared and redrawn without touching its neighbours.
+    _, y = tile_position(layout, row * layout['cols'])
+    row_height = layout['thumbnail_size'] + layout['vertical_spacing'] + layout['text_height']
+    return (0, y - 2, layout['canvas_width'], y - 2 + row_height)
+
+
+def output_filename(category, output_format="png"):
+    return f"{category}.{OUTPUT_FORMATS[output_format]['extension']}"
+
+
+def save_locker_image(image, filename, output_format="png"):
+    temp_path = f"{filename}.tmp"
+    image.save(temp_path, **OUTPUT_FORMATS[output_format]["save"])
+    os.replace(temp_path, filename)
+
+
+def render_category(category, layout, tiles, output_dir=".", output_format="png"):
+    from PIL import Image, ImageDraw
+    
+    composite_start = time.time()
+    canvas_width = layout['canvas_width']
+    
+    locker_image = Image.new('RGB', (canvas_width, layout['canvas_height']), CANVAS_COLOR)
+    draw = ImageDraw.Draw(locker_image)
+    fonts = load_fonts(layout)
+    
+    category_name = category.replace("Athena", "")
+    title = f"{category_name} ({layout['item_count']} ITEMS)"
+    paste_text(locker_image, (canvas_width//2, layout['margin']//2), title, (255, 255, 255), fonts[1], "ma")
+    
+    found_count = 0
+    not_found_count = 0
+    
+    for result in tiles:
+        if draw_tile(locker_image, draw, layout, fonts, result):
+            found_count += 1
+        else:
+            not_found_count += 1
+    
+    filename = os.path.join(output_dir, output_filename(category, output_format))
+    encode_start = time.time()
+    save_locker_image(locker_image, filename, output_format)
+    finished = time.time()
+    
+    print(f"Created image for {category}: {found_count} items found, {not_found_count} not found")
+    
+    return {
+        'category': category,
+        'found': found_count,
+        'not_found': not_found_count,
+        'finished': finished,
+        'spans': [
+            metrics.span_record("composite", composite_start, encode_start, category=category),
+            metrics.span_record("encode", encode_start, finished, category=category),
+        ],
+    }
+
+
+def patch_category(category, layout, tiles, rows, output_dir=".", output_format="png"):
+    from PIL import Image, ImageDraw
+    
+    composite_start = time.time()
+    filename = os.path.join(output_dir, output_filename(category, output_format))
+    with Image.open(filename) as existing:
+        locker_image = existing.convert('RGB')
+    draw = ImageDraw.Draw(locker_image)
+    fonts = load_fonts(layout)
+    
+    for row in sorted(rows):
+        locker_image.paste(CANVAS_COLOR, row_band(layout, row))
+    
+    for result in tiles:
+        if result['i'] // layout['cols'] in rows:
+            draw_tile(locker_image, draw, layout, fonts, result)
+    
+    encode_start = time.time()
+    save_locker_image(locker_image, filename, output_format)
+    finished = time.time()
+    
+    print(f"Patched {len(rows)} of {layout['rows']} rows in {filename}")
+    
+    return {
+        'category': category,
+        'finished': finished,
+        'spans': [
+            metrics.span_record("composite", composite_start, encode_start, category=category, rows=len(rows)),
+            metrics.span_record("encode", encode_start, finished, category=category),
+        ],
+    }
+
+
+class StreamingPNGWriter:
+    def __init__(self, path, width, height, compress_level=6):
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(compress_level)
+        self.file = open(self.temp_path, "wb")
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        # 8-bit truecolour, deflate, no interlacing.
+        self.write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    
+    def write_chunk(self, chunk_type, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(chunk_type)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+    
+    def write_band(self, band):
+        stride = self.width * 3
+        raw = band.tobytes()
+        # Every scanline is prefixed with filter type 0 (None).
+        scanlines = b"".join(
+            b"\x00" + raw[offset:offset + stride] for offset in range(0, len(raw), stride)
+        )
+        compressed = self.compressor.compress(scanlines)
+        if compressed:
+            self.write_chunk(b"IDAT", compressed)
+        self.rows_written += band.height
+    
+    def close(self):
+        if self.rows_written != self.height:
+            self.file.close()
+            os.remove(self.temp_path)
+            raise ValueError(f"{self.path}: wrote {self.rows_written} of {self.height} rows")
+        self.write_chunk(b"IDAT", self.compressor.flush())
+        self.write_chunk(b"IEND", b"")
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+
+class StreamingCategoryRenderer:
+    def __init__(self, category, layout, output_dir=".", output_format="png", background=False):
+        from PIL import Image
+        
+        self.category = category
+        self.layout = layout
+        self.fonts = load_fonts(layout)
+        self.filename = os.path.join(output_dir, output_filename(category, output_format))
+        compress_level = OUTPUT_FORMATS[output_format]["save"].get("compress_level", 6)
+        self.writer = StreamingPNGWriter(self.filename, layout['canvas_width'], layout['canvas_height'],
+                                         compress_level=compress_level)
+        self.pending_rows = {}
+        self.next_row = 0
+        self.found_count = 0
+        self.not_found_count = 0
+        
+        # In the background, bands are compressed on their own thread while
+        # the next rows are composited; the bounded queue caps the memory held
+        # by bands waiting for the encoder.
+        self.encode_queue = None
+        self.encode_error = None
+        if background:
+            self.encode_queue = queue.Queue(maxsize=4)
+            self.encoder = threading.Thread(target=self.encode_stage, daemon=True)
+            self.encoder.start()
+        
+        title_band_height = min(row_band(layout, 0)[1], layout['canvas_height'])
+        title_band = Image.new('RGB', (layout['canvas_width'], title_band_height), CANVAS_COLOR)
+        category_name = category.replace("Athena", "")
+        title = f"{category_name} ({layout['item_count']} ITEMS)"
+        paste_text(title_band, (layout['canvas_width']//2, layout['margin']//2), title, (255, 255, 255),
+                   self.fonts[1], "ma")
+        self.encode(title_band)
+    
+    def encode(self, band, row=None):
+        if self.encode_queue is not None:
+            self.encode_queue.put((band, row))
+            return
+        with metrics.span("encode", category=self.category, row=row):
+            self.writer.write_band(band)
+    
+    def encode_stage(self):
+        while True:
+            job = self.encode_queue.get()
+            if job is None:
+                return
+            band, row = job
+            if self.encode_error is not None:
+                continue
+            try:
+                with metrics.span("encode", category=self.category, row=row):
+                    self.writer.write_band(band)
+            except Exception as e:
+                # Reported by close(); later bands are drained and dropped.
+                self.encode_error = e
+    
+    def row_size(self, row):
+        return min(self.layout['cols'], self.layout['item_count'] - row * self.layout['cols'])
+    
+    def add(self, tile):
+        row = tile['i'] // self.layout['cols']
+        self.pending_rows.setdefault(row, []).append(tile)
+        
+        # Rows go to the encoder strictly in order; a row waits until every
+        # tile in it has arrived and everything above it has been written.
+        while len(self.pending_rows.get(self.next_row, ())) == self.row_size(self.next_row):
+            self.emit_row(self.next_row)
+            self.next_row += 1
+            if self.next_row == self.layout['rows']:
+                break
+    
+    def emit_row(self, row):
+        from PIL import Image, ImageDraw
+        
+        _, top, width, bottom = row_band(self.layout, row)
+        bottom = min(bottom, self.layout['canvas_height'])
+        with metrics.span("composite", category=self.category, row=row):
+            band = Image.new('RGB', (width, bottom - top), CANVAS_COLOR)
+            draw = ImageDraw.Draw(band)
+            
+            for tile in sorted(self.pending_rows.pop(row), key=lambda tile: tile['i']):
+                if draw_tile(band, draw, self.layout, self.fonts, tile, origin_y=top):
+                    self.found_count += 1
+                else:
+                    self.not_found_count += 1
+                # The thumbnail is on the band now; let it go.
+                tile['image'] = None
+        
+        self.encode(band, row)
+    
+    def close(self):
+        from PIL import Image
+        
+        band_end = row_band(self.layout, self.layout['rows'] - 1)[3]
+        if band_end < self.layout['canvas_height']:
+            self.encode(Image.new(
+                'RGB', (self.layout['canvas_width'], self.layout['canvas_height'] - band_end), CANVAS_COLOR
+            ))
+        if self.encode_queue is not None:
+            self.encode_queue.put(None)
+            self.encoder.join()
+            if self.encode_error is not None:
+                self.writer.file.close()
+                os.remove(self.writer.temp_path)
+                raise self.encode_error
+        self.writer.close()
+        print(f"Created image for {self.category}: {self.found_count} items found, "
+              f"{self.not_found_count} not found (streamed)")
+
+
+def tile_signature(tile):
+    item_data = tile['item_data'] or {}
+    return [
+        tile['item_id'],
+        tile['found'],
+        tile['image'] is not None,
+        item_data.get("name"),
+        item_data.get("rarity", {}).get("value"),
+        tile.get('icon_url'),
+    ]
+
+
+def load_build_manifest(output_dir="."):
+    path = os.path.join(output_dir, BUILD_MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest.get("categories", {})
+
+
+def save_build_manifest(entries, output_dir="."):
+    path = os.path.join(output_dir, BUILD_MANIFEST_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"categories": entries}, f)
+    os.replace(path + ".tmp", path)
+
+
+def output_stamp(filename):
+    if not os.path.exists(filename):
+        return None
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def locker_manifest(entries, match_report=None, catalog_version=None):
+    # Built from the build manifest rather than the tiles of this run, so
+    # categories that were up to date and skipped are listed as well.
+    match_report = match_report or {}
+    manifest = {"catalog_version": catalog_version, "categories": {}}
+    
+    for category in categories:
+        entry = entries.get(category)
+        if not entry:
+            continue
+        layout = entry['layout']
+        resolved = match_report.get(category, {})
+        
+        tiles = []
+        for i, (item_id, found, has_image, name, rarity, icon_url) in enumerate(entry['tiles']):
+            x, y = tile_position(layout, i)
+            if found and has_image:
+                status = "found"
+            elif found:
+                status = "image missing"
+            else:
+                status = "not found"
+            tiles.append({
+                "item_id": item_id,
+                "x": x,
+                "y": y,
+                "size": layout['thumbnail_size'],
+                "name": name,
+                "rarity": rarity,
+                "status": status,
+                "method": resolved.get(item_id, {}).get("method"),
+                "icon_url": icon_url,
+            })
+        
+        manifest["categories"][category] = {
+            "image": entry.get('output_file', f"{category}.png"),
+            "width": layout['canvas_width'],
+            "height": layout['canvas_height'],
+            "columns": layout['cols'],
+            "thumbnail_size": layout['thumbnail_size'],
+            "found": entry['found'],
+            "not_found": entry['not_found'],
+            "tiles": tiles,
+        }
+    return manifest
+
+
+def locker_html(manifest):
+    import html
+    
+    def css_color(rgb):
+        return "#%02x%02x%02x" % rgb
+    
+    parts = [
+        "<!DOCTYPE html>",
+        "<html><head><meta charset=\"utf-8\"><title>Fortnite Locker</title><style>",
+        f"body{{background:{css_color(CANVAS_COLOR)};color:#fff;font-family:Arial,sans-serif;margin:2em}}",
+        ".grid{display:grid;gap:8px 8px}",
+        ".tile{text-align:center;font-size:12px;overflow:hidden}",
+        ".tile img,.tile .missing{display:block;width:100%;aspect-ratio:1;border:2px solid #000;box-sizing:border-box}",
+        ".tile .missing{background:#282828;color:#b4b4b4;font-size:24px;line-height:3}",
+        ".tile.not-found span{color:#ffc8c8}",
+        "</style></head><body>",
+    ]
+    for category, section in manifest["categories"].items():
+        size = section["thumbnail_size"]
+        parts.append(
+            f"<h2>{html.escape(category.replace('Athena', ''))} ({len(section['tiles'])} items, "
+            f"{section['found']} found) <a href=\"{html.escape(section['image'])}\">full image</a></h2>"
+        )
+        parts.append(f"<div class=\"grid\" style=\"grid-template-columns:repeat({section['columns']},{size}px)\">")
+        for tile in section["tiles"]:
+            label = html.escape(tile["name"] or tile["item_id"])
+            if tile["status"] == "found":
+                # loading="lazy" only fetches the icons that scroll into view.
+                color = css_color(RARITY_COLORS.get(tile["rarity"] or "common", (100, 100, 100)))
+                parts.append(
+                    f"<div class=\"tile\" title=\"{html.escape(tile['item_id'])}\">"
+                    f"<img loading=\"lazy\" src=\"{html.escape(tile['icon_url'])}\" alt=\"{label}\" "
+                    f"style=\"background:{color}\"><span>{label}</span></div>"
+                )
+            else:
+                parts.append(
+                    f"<div class=\"tile not-found\" title=\"{html.escape(tile['item_id'])}\">"
+                    f"<div class=\"missing\">?</div><span>{html.escape(tile['status'].title())}: {label}</span></div>"
+                )
+        parts.append("</div>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def write_locker_manifest(entries, match_report=None, catalog_version=None, output_dir="."):
+    manifest = locker_manifest(entries, match_report, catalog_version)
+    for filename, content in ((LOCKER_MANIFEST_FILE, json.dumps(manifest, indent=1)),
+                              (LOCKER_HTML_FILE, locker_html(manifest))):
+        path = os.path.join(output_dir, filename)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+    return manifest
+
+
+def start_process_pool(workers):
+    import concurrent.futures
+    
+    # A worker forked while other threads run inherits any lock they hold at
+    # that moment (stdout's, mid-print) and can deadlock on it. The first
+    # submit forks every worker, so it is made before any thread starts.
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    executor.submit(os.getpid).result()
+    return executor
+
+
+class LockerPipeline:
+    def __init__(self, index, downloader, match_workers=1, fetch_workers=15,
+                 composite_workers=None, queue_size=256, catalog_version=None, manifest=None,
+                 output_dir=".", executor=None, stream_threshold=STREAMING_THRESHOLD, output_format="png",
+                 background_encode=False):
+        self.index = index
+        self.downloader = downloader
+        self.match_workers = max(1, match_workers)
+        self.fetch_workers = max(1, fetch_workers)
+        if composite_workers is None:
+            composite_workers = min(4, os.cpu_count() or 1)
+        self.composite_workers = composite_workers
+        self.catalog_version = catalog_version
+        self.manifest = manifest if manifest is not None else {}
+        self.output_dir = output_dir
+        self.executor = executor
+        self.stream_threshold = stream_threshold
+        self.output_format = output_format
+        self.background_encode = background_encode
+        
+        # Bounded queues keep a fast stage from racing ahead of a slow one.
+        self.fetch_queue = queue.Queue(maxsize=queue_size)
+        self.composite_queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.active_matchers = 0
+    
+    def output_path(self, filename):
+        return os.path.join(self.output_dir, filename)
+    
+    def streams(self, layout):
+        return self.stream_threshold is not None and layout['item_count'] > self.stream_threshold
+    
+    def category_format(self, layout):
+        # WebP and JPEG need the whole canvas in memory (WebP also stops at
+        # 16383 px), so lockers big enough to stream are written as PNG.
+        if self.streams(layout) and OUTPUT_FORMATS[self.output_format]["extension"] != "png":
+            return "png-fast"
+        return self.output_format
+    
+    def category_output(self, category, layout):
+        return output_filename(category, self.category_format(layout))
+    
+    def is_up_to_date(self, category, ids_hash, layout):
+        entry = self.manifest.get(category)
+        if not entry:
+            return False
+        if any(found and not has_image and icon_url
+               for _, found, has_image, _, _, icon_url in entry.get("tiles", [])):
+            # Tiles whose image failed to download get another chance; tiles
+            # without an icon URL never get one, so they don't count.
+            return False
+        return (
+            entry.get("ids_hash") == ids_hash
+            and entry.get("catalog_version") == self.catalog_version
+            and entry.get("layout") == layout
+            and entry.get("renderer_version") == RENDERER_VERSION
+            and entry.get("output") == output_stamp(self.output_path(self.category_output(category, layout)))
+        )
+    
+    def changed_rows(self, category, layout, signatures):
+        entry = self.manifest.get(category)
+        if not entry:
+            return None
+        if (entry.get("layout") != layout
+                or entry.get("renderer_version") != RENDERER_VERSION
+                or entry.get("output") != output_stamp(self.output_path(self.category_output(category, layout)))
+                or len(entry.get("tiles", [])) != len(signatures)):
+            return None
+        if not OUTPUT_FORMATS[self.category_format(layout)]["lossless"]:
+            # Patching would re-encode the lossy image and degrade every row.
+            return None
+        
+        return {
+            i // layout['cols']
+            for i, (previous, current) in enumerate(zip(entry["tiles"], signatures))
+            if previous != current
+        }
+    
+    def match_category(self, category):
+        category_start = time.time()
+        print(f"\nStarting category: {category}")
+        
+        item_ids = read_category_ids(category, self.output_dir)
+        if item_ids is None:
+            print(f"File not found: {category}.txt")
+            return
+        
+        if not item_ids:
+            print(f"No items found in {category}.txt")
+            return
+        
+        print(f"Category: {category}, Items found: {len(item_ids)}")
+        
+        layout = category_layout(len(item_ids))
+        ids_hash = hashlib.sha1("\n".join(item_ids).encode("utf-8")).hexdigest()
+        
+        if self.is_up_to_date(category, ids_hash, layout):
+            print(f"{self.category_output(category, layout)} is up to date, skipping")
+            self.composite_queue.put(("skipped", category))
+            return
+        
+        # The compositor has to know the category before its first tile arrives.
+        self.composite_queue.put(("category", category, layout, category_start, ids_hash))
+        
+        match_start = time.time()
+        match_time = 0.0
+        for i, item_id in enumerate(item_ids):
+            tile = {
+                'i': i, 'item_id': item_id, 'found': False,
+                'image': None, 'item_data': None, 'icon_url': None,
+            }
+            
+            resolve_start = time.perf_counter()
+            try:
+                item_data, method = self.index.resolve(item_id, category)
+                metrics.count(f"match.{method}")
+                
+                if item_data and "images" in item_data:
+                    tile['found'] = True
+                    tile['item_data'] = {
+                        key: item_data[key] for key in ("name", "rarity") if key in item_data
+                    }
+                    tile['icon_url'] = select_icon_url(item_data)
+            except Exception as e:
+                print(f"Error processing {item_id}: {e}")
+                metrics.error("match", e, category=category, item_id=item_id)
+            match_time += time.perf_counter() - resolve_start
+            
+            self.fetch_queue.put((category, layout['thumbnail_size'], tile))
+        
+        # The span also covers time blocked on a full fetch queue, so the
+        # time spent resolving ids is recorded separately.
+        metrics.add_spans([metrics.span_record(
+            "match", match_start, time.time(),
+            category=category, items=len(item_ids), resolve_seconds=match_time,
+        )])
+    
+    def match_stage(self, category_queue):
+        try:
+            while True:
+                try:
+                    category = category_queue.get_nowait()
+                except queue.Empty:
+                    return
+                self.match_category(category)
+        finally:
+            with self.lock:
+                self.active_matchers -= 1
+                last_matcher = self.active_matchers == 0
+            if last_matcher:
+                for _ in range(self.fetch_workers):
+                    self.fetch_queue.put(None)
+    
+    def fetch_stage(self):
+        while True:
+            job = self.fetch_queue.get()
+            if job is None:
+                self.composite_queue.put(None)
+                return
             
-        cache_filename = os.path.join(
-            self.cache_dir, 
-            re.sub(r'[^\w]', '_', url) + f"_{size[0]}x{size[1]}.png"
-        )
+            category, thumbnail_size, tile = job
+            if tile['icon_url']:
+                try:
+                    with metrics.span("fetch", category=category, item_id=tile['item_id']):
+                        tile['image'] = self.downloader.download_image(tile['icon_url'], (thumbnail_size, thumbnail_size))
+                except Exception as e:
+                    print(f"Error processing {tile['item_id']}: {e}")
+                    metrics.error("fetch", e, category=category, item_id=tile['item_id'])
+            
+            self.composite_queue.put(("tile", category, tile))
+    
+    def run(self, category_names):
+        import concurrent.futures
         
-        if os.path.exists(cache_filename):
-            try:
-                return Image.open(cache_filename)
-            except Exception:
-                pass
+        category_queue = queue.Queue()
+        for category in category_names:
+            category_queue.put(category)
         
-        with self.rate_limit:
-            try:
-                response = self.session.get(url, timeout=5)
-                response.raise_for_status()
+        # A shared executor (batch mode) belongs to the caller; only a pool
+        # created here is shut down at the end of the run. Its workers are
+        # started before the match and fetch threads.
+        executor = self.executor
+        owns_executor = executor is None and (bool(self.composite_workers) or self.background_encode)
+        if owns_executor and self.composite_workers:
+            executor = start_process_pool(self.composite_workers)
+        elif owns_executor:
+            # Without worker processes, one thread composites and encodes
+            # while this loop keeps taking tiles off the queue.
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        
+        self.active_matchers = self.match_workers
+        threads = [
+            threading.Thread(target=self.match_stage, args=(category_queue,), daemon=True)
+            for _ in range(self.match_workers)
+        ] + [
+            threading.Thread(target=self.fetch_stage, daemon=True)
+            for _ in range(self.fetch_workers)
+        ]
+        for thread in threads:
+            thread.start()
+        
+        pending = {}
+        renders = {}
+        results = []
+        
+        def finish(state, status, finished=None):
+            category = state['category']
+            signatures = state['signatures']
+            output_file = self.category_output(category, state['layout'])
+            found = sum(1 for _, tile_found, has_image, *_ in signatures if tile_found and has_image)
+            self.manifest[category] = {
+                'ids_hash': state['ids_hash'],
+                'catalog_version': self.catalog_version,
+                'layout': state['layout'],
+                'renderer_version': RENDERER_VERSION,
+                'tiles': signatures,
+                'found': found,
+                'not_found': len(signatures) - found,
+                'output_file': output_file,
+                'output': output_stamp(self.output_path(output_file)),
+            }
+            result_time = (finished or time.time()) - state['start']
+            print(f"Total time for {category}: {result_time:.2f}s")
+            results.append({
+                'category': category,
+                'found': found,
+                'not_found': len(signatures) - found,
+                'time': result_time,
+                'status': status,
+            })
+        
+        try:
+            finished_fetchers = 0
+            while finished_fetchers < self.fetch_workers:
+                message = self.composite_queue.get()
+                if message is None:
+                    finished_fetchers += 1
+                    continue
                 
-                img = Image.open(BytesIO(response.content))
-                img = img.resize(size)
+                if message[0] == "skipped":
+                    entry = self.manifest[message[1]]
+                    results.append({
+                        'category': message[1],
+                        'found': entry['found'],
+                        'not_found': entry['not_found'],
+                        'time': 0.0,
+                        'status': "up to date",
+                    })
+                    continue
                 
-                img.save(cache_filename)
+                if message[0] == "category":
+                    _, category, layout, category_start, ids_hash = message
+                    state = pending[category] = {
+                        'category': category, 'layout': layout, 'start': category_start,
+                        'ids_hash': ids_hash, 'tiles': [], 'received': 0, 'stream': None,
+                    }
+                    if self.streams(layout):
+                        # Large lockers are encoded row by row instead of on
+                        # one canvas, so only unfinished rows stay in memory.
+                        state['stream'] = StreamingCategoryRenderer(
+                            category, layout, self.output_dir, self.category_format(layout),
+                            background=self.background_encode,
+                        )
+                        state['signatures'] = [None] * layout['item_count']
+                    continue
                 
-                return img
-            except Exception as e:
-                print(f"Error downloading {url}: {e}")
-                return None
+                _, category, tile = message
+                state = pending[category]
+                state['received'] += 1
+                if state['stream']:
+                    state['signatures'][tile['i']] = tile_signature(tile)
+                    state['stream'].add(tile)
+                else:
+                    state['tiles'].append(tile)
+                if state['received'] < state['layout']['item_count']:
+                    continue
+                
+                if state['stream']:
+                    del pending[category]
+                    state.pop('stream').close()
+                    finish(state, "streamed")
+                    continue
+                
+                del pending[category]
+                layout = state['layout']
+                tiles = sorted(state.pop('tiles'), key=lambda tile: tile['i'])
+                state['signatures'] = [tile_signature(tile) for tile in tiles]
+                rows = self.changed_rows(category, layout, state['signatures'])
+                
+                if rows is not None and not rows:
+                    print(f"{self.category_output(category, layout)} already shows every tile, nothing to redraw")
+                    finish(state, "unchanged")
+                    continue
+                
+                if rows is not None and len(rows) < layout['rows']:
+                    status = "patched"
+                    job = (patch_category, category, layout,
+                           [tile for tile in tiles if tile['i'] // layout['cols'] in rows], rows,
+                           self.output_dir, self.category_format(layout))
+                else:
+                    status = "rendered"
+                    job = (render_category, category, layout, tiles, self.output_dir, self.category_format(layout))
+                
+                if executor:
+                    renders[executor.submit(*job)] = (state, status)
+                else:
+                    render_result = job[0](*job[1:])
+                    metrics.add_spans(render_result['spans'])
+                    finish(state, status, render_result['finished'])
+            
+            for future in concurrent.futures.as_completed(renders):
+                state, status = renders[future]
+                render_result = future.result()
+                metrics.add_spans(render_result['spans'])
+                finish(state, status, render_result['finished'])
+        finally:
+            if owns_executor:
+                executor.shutdown()
+            for thread in threads:
+                thread.join(timeout=1)
+        
+        return results
 
 
-def normalize_string(s):
-    if not s:
-        return ""
-    return re.sub(r'[^a-z0-9]', '', unidecode(s).lower())
+def load_locker_index():
+    print("Loading cosmetics catalog...")
+    with metrics.span("catalog_load") as span:
+        catalog_version, cosmetics_items, aliases = load_cosmetics_catalog()
+        span["args"]["items"] = len(cosmetics_items)
+    print(f"Catalog loaded in {span['duration']:.2f} seconds")
+    
+    print("Creating optimized lookup dictionaries...")
+    with metrics.span("index_build") as span:
+        match_cache = MatchCache(catalog_version)
+        index = CosmeticsIndex(cosmetics_items, match_cache=match_cache, aliases=aliases)
+    print(f"Optimized dictionaries created in {span['duration']:.2f} seconds")
+    
+    return catalog_version, index, match_cache
 
 
-def process_pdf(file_path, password=None):
+def render_locker(index, downloader, catalog_version, output_dir=".", match_workers=1, fetch_workers=15,
+                  composite_workers=None, queue_size=256, incremental=True, executor=None,
+                  stream_threshold=STREAMING_THRESHOLD, output_format="png", background_encode=False):
+    pipeline = LockerPipeline(
+        index, downloader,
+        match_workers=match_workers,
+        fetch_workers=fetch_workers,
+        composite_workers=composite_workers,
+        queue_size=queue_size,
+        catalog_version=catalog_version,
+        manifest=load_build_manifest(output_dir) if incremental else {},
+        output_dir=output_dir,
+        executor=executor,
+        stream_threshold=stream_threshold,
+        output_format=output_format,
+        background_encode=background_encode,
+    )
     try:
-        reader = PdfReader(file_path)
-        
-        if reader.is_encrypted:
-            if password:
-                reader.decrypt(password)
-            else:
-                raise ValueError("Password is required for encrypted PDF.")
+        with metrics.span("render_locker", output_dir=output_dir):
+            results = pipeline.run(categories)
+    finally:
+        save_build_manifest(pipeline.manifest, output_dir)
+    
+    match_report = write_match_report(index, categories, output_dir)
+    write_locker_manifest(pipeline.manifest, match_report, catalog_version, output_dir)
+    return results
 
-        data = {key: [] for key in categories}
 
-        for page in reader.pages:
-            text = page.extract_text()
-            matches = pattern.findall(text)
-            for category, details in matches:
-                if category in categories:
-                    filtered_details = re.sub(r'1$', '', details.strip())
-                    filtered_details = filtered_details.replace('_', '-')
-                    
-                    if category == "AthenaDance" and not filtered_details.startswith("eid-"):
-                        continue
-                        
-                    url_entry = filtered_details
-                    data[category].append(url_entry)
+def print_cache_stats(downloader):
+    cache_stats = downloader.cache.stats()
+    print(f"\nImage cache: {cache_stats['pyramid_hits']} pyramid hits, "
+          f"{cache_stats['original_hits']} original hits, {cache_stats['misses']} misses, "
+          f"{cache_stats['evictions']} evictions, "
+          f"{cache_stats['bytes'] / (1024 * 1024):.1f}/{cache_stats['max_bytes'] / (1024 * 1024):.0f} MB")
+    if cache_stats['offline_misses']:
+        print(f"{cache_stats['offline_misses']} images were not cached and the network is disabled; "
+              f"run the prefetch command to fill the cache.")
 
-        for category, filename in categories.items():
-            sorted_items = sorted(data[category])
-            with open(filename, "w") as f:
-                f.write("\n".join(sorted_items))
-        
-        print("Processing complete. Files created for each category.")
-    except Exception as e:
-        print(f"An error occurred: {e}")
+
+def print_summary(results, indent="  "):
+    for result in sorted(results, key=lambda x: x['category']):
+        print(f"{indent}{result['category']}: {result['found']} found, {result['not_found']} not found, "
+              f"{result['time']:.2f}s ({result['status']})")
 
 
-def download_fortnite_cosmetics():
-    url = "https://fortnite-api.com/v2/cosmetics/br"
+def create_locker_image(match_workers=1, fetch_workers=15, composite_workers=None, queue_size=256,
+                        incremental=True, stream_threshold=STREAMING_THRESHOLD, output_dir=".",
+                        cache_dir=IMAGE_CACHE_DIR, offline=False, max_cache_bytes=IMAGE_CACHE_MAX_BYTES,
+                        output_format="png", background_encode=False, locker_index=None, downloader=None):
+    print("Starting create_locker_image function...")
+    start_time = time.time()
+    results = []
     
-    print("Downloading Fortnite cosmetics data...")
     try:
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            print(f"Successfully retrieved {len(data['data'])} cosmetic items")
-            
-            with open("fortnite_cosmetics.json", "w") as f:
-                json.dump(data, f, indent=4)
-            print("Data saved to fortnite_cosmetics.json")
-            return True
-        else:
-            print(f"Error: API request failed with status code {response.status_code}")
-            print(f"Response: {response.text}")
-            return False
-            
+        # main() passes the index and downloader it already used while the
+        # PDF was parsed.
+        catalog_version, index, match_cache = locker_index or load_locker_index()
+        if downloader is None:
+            downloader = ImageDownloader(max_workers=fetch_workers, cache_dir=cache_dir, offline=offline,
+                                         max_cache_bytes=max_cache_bytes)
+        results = render_locker(
+            index, downloader, catalog_version,
+            output_dir=output_dir,
+            match_workers=match_workers,
+            fetch_workers=fetch_workers,
+            composite_workers=composite_workers,
+            queue_size=queue_size,
+            incremental=incremental,
+            stream_threshold=stream_threshold,
+            output_format=output_format,
+            background_encode=background_encode,
+        )
+        match_cache.save()
+        print_cache_stats(downloader)
+    
     except Exception as e:
-        print(f"An error occurred: {str(e)}")
-        return False
+        print(f"Error in create_locker_image: {e}")
+        metrics.error("create_locker_image", e)
+        traceback.print_exc()
+    
+    total_time = time.time() - start_time
+    print(f"\nTotal execution time: {total_time:.2f} seconds")
+    print("Summary:")
+    print_summary(results)
 
 
-def ensure_cosmetics_data():
-    if not os.path.exists("fortnite_cosmetics.json"):
-        print("Fortnite cosmetics data not found. Downloading...")
-        return download_fortnite_cosmetics()
+def load_batch_accounts(source):
+    accounts = []
+    
+    if os.path.isdir(source):
+        passwords = {}
+        passwords_path = os.path.join(source, "passwords.json")
+        if os.path.exists(passwords_path):
+            with open(passwords_path, "r") as f:
+                passwords = json.load(f)
+        
+        for filename in sorted(os.listdir(source)):
+            if not filename.lower().endswith(".pdf"):
+                continue
+            name = os.path.splitext(filename)[0]
+            accounts.append({
+                "name": name,
+                "pdf": os.path.join(source, filename),
+                "password": passwords.get(filename, passwords.get(name)),
+            })
     else:
-        print("Using existing Fortnite cosmetics data.")
-        return True
+        with open(source, "r") as f:
+            entries = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(source))
+        for entry in entries:
+            pdf = os.path.join(base_dir, entry["pdf"])
+            accounts.append({
+                "name": entry.get("name") or os.path.splitext(os.path.basename(pdf))[0],
+                "pdf": pdf,
+                "password": entry.get("password"),
+            })
+    
+    return accounts
 
 
-def create_locker_image():
-    print("Starting create_locker_image function...")
+def extract_account(file_path, password, output_dir):
+    # Runs in a worker process, which already is the unit of parallelism,
+    # so the PDF is not split across a second pool. A forked worker starts
+    # with a copy of the parent's metrics, so only its own are sent back.
+    metrics.reset()
+    ok = process_pdf(file_path, password, jobs=1, output_dir=output_dir) is not None
+    return ok, metrics.drain()
+
+
+def run_batch(source, output_root="lockers", jobs=None, fetch_workers=15, accounts_in_parallel=2,
+              incremental=True, refresh_catalog=False, cache_dir=IMAGE_CACHE_DIR, offline=False,
+              max_cache_bytes=IMAGE_CACHE_MAX_BYTES, output_format="png", background_encode=False):
+    import concurrent.futures
+    
     start_time = time.time()
+    accounts = load_batch_accounts(source)
+    if not accounts:
+        print(f"No account PDFs found in {source}")
+        return {}
+    print(f"Processing {len(accounts)} accounts into {output_root}")
     
-    try:
-        print("Loading cosmetics data from JSON file...")
-        load_start = time.time()
-        with open("fortnite_cosmetics.json", "r") as f:
-            cosmetics_data = json.load(f)
-        print(f"JSON loaded in {time.time() - load_start:.2f} seconds")
-        
-        print("Creating optimized lookup dictionaries...")
-        dict_start = time.time()
-        
-        cosmetics_lookup = {}
-        type_specific_lookup = {cat: {} for cat in categories}
-        
-        for item in cosmetics_data.get("data", []):
-            if isinstance(item, dict) and "id" in item and "type" in item:
-                item_id = item["id"].lower()
-                cosmetics_lookup[item_id] = item
-                
-                item_type = item.get("type", {}).get("backendValue", "")
-                if item_type in type_specific_lookup:
-                    type_specific_lookup[item_type][item_id] = item
-                    
-                    if "name" in item:
-                        normalized_name = normalize_string(item["name"])
-                        type_specific_lookup[item_type][normalized_name] = item
-                        
-                        if item_type == "AthenaGlider" and "umbrella" in item_id:
-                            type_specific_lookup[item_type]["umbrella"] = item
-                        
-                        if "-" in item_id:
-                            without_prefix = item_id.split("-", 1)[1]
-                            type_specific_lookup[item_type][without_prefix] = item
-        
-        print(f"Optimized dictionaries created in {time.time() - dict_start:.2f} seconds")
-        
-        downloader = ImageDownloader(max_workers=15, cache_dir="cosmetics_cache")
-        fuzzy_match_count = {}
-        
-        def find_item_match(item_id, category):
-            item_id = item_id.strip().lower()
-            
-            if item_id in cosmetics_lookup:
-                item = cosmetics_lookup[item_id]
-                if item.get("type", {}).get("backendValue", "") == category:
-                    return item
-            
-            if item_id in type_specific_lookup[category]:
-                return type_specific_lookup[category][item_id]
-            
-            if category == "AthenaBackpack" and "petcarrier-" in item_id:
-                for id_key, item in type_specific_lookup[category].items():
-                    if "petcarrier-" in id_key and id_key.split("petcarrier-")[1] in item_id:
-                        return item
-                    elif "petcarrier-" in id_key and item_id.replace("petcarrier-", "") in id_key:
-                        return item
-            
-            if "-" in item_id:
-                without_prefix = item_id.split("-", 1)[1]
-                if without_prefix in type_specific_lookup[category]:
-                    return type_specific_lookup[category][without_prefix]
-            
-            variation = item_id.replace("-", "_")
-            if variation in type_specific_lookup[category]:
-                return type_specific_lookup[category][variation]
-            
-            if category == "AthenaGlider" and "umbrella" in item_id:
-                if "umbrella" in type_specific_lookup[category]:
-                    return type_specific_lookup[category]["umbrella"]
-            
-            normalized_id = normalize_string(item_id)
-            
-            if fuzzy_match_count.get(category, 0) < 10:
-                fuzzy_match_count[category] = fuzzy_match_count.get(category, 0) + 1
-                
-                best_match = None
-                best_score = 0.65
-                
-                for id_key, item in type_specific_lookup[category].items():
-                    if len(id_key) < 3:
-                        continue
-                        
-                    similarity = difflib.SequenceMatcher(None, normalized_id, id_key).ratio()
-                    if similarity > best_score:
-                        best_score = similarity
-                        best_match = item
-                
-                if best_match:
-                    return best_match
-            
-            return None
+    if not ensure_cosmetics_data(refresh=refresh_catalog, offline=offline):
+        print("Failed to obtain cosmetics data. Cannot create locker images.")
+        return {}
+    
+    catalog_version, index, match_cache = load_locker_index()
+    downloader = ImageDownloader(max_workers=fetch_workers, cache_dir=cache_dir, offline=offline,
+                                 max_cache_bytes=max_cache_bytes)
+    jobs = jobs or os.cpu_count() or 1
+    results = {}
+    
+    # One process pool serves both PDF extraction and compositing for every
+    # account; a few accounts at a time feed it from the shared fetch pool.
+    with start_process_pool(jobs) as process_pool, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=accounts_in_parallel) as account_pool:
+        extractions = {}
+        for account in accounts:
+            output_dir = os.path.join(output_root, account["name"])
+            future = process_pool.submit(extract_account, account["pdf"], account["password"], output_dir)
+            extractions[future] = (account, output_dir)
         
-        def process_category(category):
-            category_start = time.time()
-            print(f"\nStarting category: {category}")
-            
-            if not os.path.exists(f"{category}.txt"):
-                print(f"File not found: {category}.txt")
-                return None
-                
-            with open(f"{category}.txt", "r") as f:
-                item_ids = [line.strip() for line in f.read().strip().split("\n")]
-            
-            if not item_ids:
-                print(f"No items found in {category}.txt")
-                return None
-            
-            print(f"Category: {category}, Items found: {len(item_ids)}")
-            
-            item_count = len(item_ids)
-            cols = math.ceil(math.sqrt(item_count * 1.5))
-            rows = math.ceil(item_count / cols)
-            
-            thumbnail_size = max(60, min(150, int(900 / cols)))
-            horizontal_spacing = max(8, thumbnail_size // 10)
-            vertical_spacing = max(40, thumbnail_size // 2)
-            text_height = max(16, thumbnail_size // 6)
-            padding = 3
-            
-            margin = 60
-            canvas_width = margin * 2 + cols * (thumbnail_size + horizontal_spacing)
-            canvas_height = margin * 2 + rows * (thumbnail_size + vertical_spacing + text_height)
-            
-            locker_image = Image.new('RGB', (canvas_width, canvas_height), (25, 25, 35))
-            draw = ImageDraw.Draw(locker_image)
-            
-            font_size = max(12, thumbnail_size // 8)
-            title_font_size = max(24, font_size * 1.8)
-            try:
-                font = ImageFont.truetype("arial.ttf", font_size)
-                title_font = ImageFont.truetype("arial.ttf", title_font_size)
-            except IOError:
-                font = ImageFont.load_default()
-                title_font = ImageFont.load_default()
-            
-            category_name = category.replace("Athena", "")
-            title = f"{category_name} ({item_count} ITEMS)"
-            draw.text((canvas_width//2, margin//2), title, fill=(255, 255, 255), font=title_font, anchor="ma")
-            
-            found_count = 0
-            not_found_count = 0
-            
-            def process_item(args):
-                i, item_id = args
-                row = i // cols
-                col = i % cols
-                
-                x = margin + col * (thumbnail_size + horizontal_spacing)
-                y = margin + row * (thumbnail_size + vertical_spacing + text_height) + 60
-                
-                result = {
-                    'i': i, 'x': x, 'y': y, 'item_id': item_id,
-                    'found': False, 'image': None, 'item_data': None
-                }
-                
-                try:
-                    item_data = find_item_match(item_id, category)
-                    
-                    if item_data and "images" in item_data:
-                        result['found'] = True
-                        result['item_data'] = item_data
-                        
-                        icon_url = None
-                        for img_key in ["icon", "smallIcon", "featured"]:
-                            if img_key in item_data["images"] and item_data["images"][img_key]:
-                                icon_url = item_data["images"][img_key]
-                                break
-                                
-                        if not icon_url and "lego" in item_data["images"]:
-                            for lego_key in ["large", "small"]:
-                                if lego_key in item_data["images"]["lego"] and item_data["images"]["lego"][lego_key]:
-                                    icon_url = item_data["images"]["lego"][lego_key]
-                                    break
-                        
-                        if icon_url:
-                            image = downloader.download_image(icon_url, (thumbnail_size, thumbnail_size))
-                            if image:
-                                result['image'] = image
-                except Exception as e:
-                    print(f"Error processing {item_id}: {e}")
-                
-                return result
-            
-            with concurrent.futures.ThreadPoolExecutor(max_workers=15) as executor:
-                item_results = list(executor.map(process_item, enumerate(item_ids)))
-            
-            for result in item_results:
-                i = result['i']
-                x = result['x']
-                y = result['y']
-                item_id = result['item_id']
-                
-                if result['found'] and result['image']:
-                    found_count += 1
-                    
-                    item_data = result['item_data']
-                    rarity = item_data.get("rarity", {}).get("value", "common")
-                    bg_colors = {
-                        "common": (150, 150, 150),
-                        "uncommon": (96, 170, 58),
-                        "rare": (73, 172, 242),
-                        "epic": (177, 91, 226),
-                        "legendary": (211, 120, 65),
-                        "mythic": (235, 227, 88),
-                        "marvel": (197, 51, 52),
-                        "dc": (84, 117, 199),
-                        "icon": (63, 181, 181),
-                        "starwars": (32, 85, 128),
-                    }
-                    bg_color = bg_colors.get(rarity, (100, 100, 100))
-                    
-                    draw.rectangle([x-2, y-2, x+thumbnail_size+2, y+thumbnail_size+2], fill=(0, 0, 0))
-                    draw.rectangle([x, y, x+thumbnail_size, y+thumbnail_size], fill=bg_color)
-                    
-                    locker_image.paste(result['image'], (x, y), mask=result['image'] if result['image'].mode == 'RGBA' else None)
-                    
-                    name_to_display = item_data.get("name", item_id)
-                    if len(name_to_display) > thumbnail_size // 4:
-                        name_to_display = name_to_display[:thumbnail_size // 4] + "..."
-                    
-                    text_y = y + thumbnail_size + 8
-                    
-                    text_width = draw.textlength(name_to_display, font=font)
-                    
-                    bg_rect = [
-                        x + (thumbnail_size - text_width) // 2 - padding,
-                        text_y - padding,
-                        x + (thumbnail_size + text_width) // 2 + padding,
-                        text_y + font_size + padding
-                    ]
-                    
-                    draw.rectangle(bg_rect, fill=(0, 0, 0, 180))
-                    
-                    shadow_offset = 1
-                    draw.text(
-                        (x + thumbnail_size // 2 + shadow_offset, text_y + shadow_offset), 
-                        name_to_display, 
-                        fill=(0, 0, 0), 
-                        font=font, 
-                        anchor="mt"
-                    )
-                    draw.text(
-                        (x + thumbnail_size // 2, text_y), 
-                        name_to_display, 
-                        fill=(255, 255, 255), 
-                        font=font, 
-                        anchor="mt"
-                    )
-                else:
-                    not_found_count += 1
-                    draw.rectangle([x, y, x+thumbnail_size, y+thumbnail_size], fill=(50, 50, 50))
-                    draw.rectangle([x+3, y+3, x+thumbnail_size-3, y+thumbnail_size-3], fill=(40, 40, 40))
-                    
-                    display_name = item_id
-                    if len(display_name) > 12:
-                        display_name = display_name[:10] + "..."
-                    
-                    draw.text(
-                        (x + thumbnail_size // 2, y + thumbnail_size // 2 - 10), 
-                        "?", 
-                        fill=(180, 180, 180), 
-                        font=title_font, 
-                        anchor="mm"
-                    )
-                    
-                    draw.text(
-                        (x + thumbnail_size // 2, y + thumbnail_size // 2 + 15), 
-                        display_name, 
-                        fill=(180, 180, 180), 
-                        font=font, 
-                        anchor="mm"
-                    )
-                    
-                    text_y = y + thumbnail_size + 8
-                    draw.rectangle(
-                        [x, text_y, x + thumbnail_size, text_y + font_size + 6],
-                        fill=(100, 30, 30)
-                    )
-                    draw.text(
-                        (x + thumbnail_size // 2, text_y + 3),
-                        "Not Found", 
-                        fill=(255, 200, 200), 
-                        font=font, 
-                        anchor="mt"
-                    )
-            
-            filename = f"{category}.png"
-            locker_image.save(filename)
-            
-            category_time = time.time() - category_start
-            print(f"Created image for {category}: {found_count} items found, {not_found_count} not found")
-            print(f"Total time for {category}: {category_time:.2f}s")
-            
-            return {
-                'category': category,
-                'found': found_count,
-                'not_found': not_found_count,
-                'time': category_time
-            }
+        renders = {}
+        for future in concurrent.futures.as_completed(extractions):
+            account, output_dir = extractions[future]
+            ok, worker_metrics = future.result()
+            metrics.merge(worker_metrics)
+            if not ok:
+                print(f"Skipping {account['name']}: could not extract items from {account['pdf']}")
+                continue
+            future = account_pool.submit(
+                render_locker, index, downloader, catalog_version, output_dir,
+                fetch_workers=fetch_workers, incremental=incremental, executor=process_pool,
+                output_format=output_format, background_encode=background_encode,
+            )
+            renders[future] = account
         
-        results = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-            futures = [executor.submit(process_category, category) for category in categories]
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                if result:
-                    results.append(result)
+        for future in concurrent.futures.as_completed(renders):
+            account = renders[future]
+            try:
+                results[account["name"]] = future.result()
+            except Exception as e:
+                print(f"Error rendering {account['name']}: {e}")
+                metrics.error("render", e, account=account['name'])
+                traceback.print_exc()
     
-    except Exception as e:
-        print(f"Error in create_locker_image: {e}")
-        traceback.print_exc()
+    match_cache.save()
+    print_cache_stats(downloader)
     
-    total_time = time.time() - start_time
-    print(f"\nTotal execution time: {total_time:.2f} seconds")
-    print("Summary:")
-    for result in sorted(results, key=lambda x: x['category']):
-        print(f"  {result['category']}: {result['found']} found, {result['not_found']} not found, {result['time']:.2f}s")
+    print(f"\nProcessed {len(results)} of {len(accounts)} accounts in {time.time() - start_time:.2f} seconds")
+    for name in sorted(results):
+        print(f"{name}:")
+        print_summary(results[name], indent="    ")
+    return results
 
 
-def main():
-    file_path = "EpicGamesAccountData.pdf"
+def open_account_pdf(file_path="EpicGamesAccountData.pdf", password=None):
+    from PyPDF2 import PdfReader
     
     if not os.path.exists(file_path):
         print(f"\nError: File '{file_path}' not found.")
         alt_path = input("Enter the path to your Epic Games Account Data PDF (or press Enter to exit): ")
         if not alt_path:
             print("Exiting program.")
-            return
+            return None
         file_path = alt_path
         if not os.path.exists(file_path):
             print(f"Error: File '{file_path}' still not found. Exiting.")
-            return
+            return None
     
     try:
         reader = PdfReader(file_path)
         is_encrypted = reader.is_encrypted
     except Exception as e:
         print(f"Error opening PDF: {e}")
-        return
+        return None
+    
+    if is_encrypted and password is not None:
+        # A password given on the command line is not asked for again.
+        try:
+            if reader.decrypt(password):
+                return file_path, reader, password
+        except Exception:
+            pass
+        print("Incorrect password.")
+        return None
     
-    password = None
     if is_encrypted:
         print("\nThe PDF file is encrypted and requires a password.")
         print("The password should be in the email you received from Epic Games.")
@@ -502,23 +2664,458 @@ def main():
             
             if not password:
                 print("No password entered. Exiting program.")
-                return
+                return None
                 
             try:
-                test_reader = PdfReader(file_path)
-                test_reader.decrypt(password)
-                print("Password accepted!")
-                break
+                if reader.decrypt(password):
+                    print("Password accepted!")
+                    break
             except Exception:
-                print("Incorrect password. Please try again.")
+                pass
+            print("Incorrect password. Please try again.")
     
-    process_pdf(file_path, password)
+    return file_path, reader, password
 
-    if ensure_cosmetics_data():
-        create_locker_image()
-    else:
+
+def catalog_icon_urls(items, types=None, rarities=None):
+    types = set(types or categories)
+    rarities = {rarity.lower() for rarity in rarities} if rarities else None
+    
+    urls = {}
+    for item in items:
+        if not isinstance(item, dict) or item.get("type", {}).get("backendValue") not in types:
+            continue
+        if rarities is not None and (item.get("rarity") or {}).get("value", "").lower() not in rarities:
+            continue
+        # The renderer makes the same choice, so every prefetched image is
+        # one a tile will ask for.
+        url = select_icon_url(item)
+        if url:
+            urls[url] = None
+    return list(urls)
+
+
+def prefetch_icons(types=None, rarities=None, cache_dir=IMAGE_CACHE_DIR, fetch_workers=15,
+                   max_cache_bytes=IMAGE_CACHE_MAX_BYTES):
+    import concurrent.futures
+    
+    start_time = time.time()
+    _, items, _ = load_cosmetics_catalog()
+    urls = catalog_icon_urls(items, types, rarities)
+    print(f"Prefetching {len(urls)} icons into {cache_dir}...")
+    
+    downloader = ImageDownloader(max_workers=fetch_workers, cache_dir=cache_dir, max_cache_bytes=max_cache_bytes)
+    failed = set()
+    with metrics.span("prefetch", icons=len(urls)):
+        for done, (url, ok) in enumerate(downloader.prefetch(urls), 1):
+            if not ok:
+                failed.add(url)
+            if done % 1000 == 0:
+                print(f"  downloaded {done} icons")
+    
+    # The pyramids come from the originals that are cached now, so this part
+    # is pure CPU; Pillow releases the GIL while it resizes and encodes.
+    pending = [url for url in urls if url not in failed]
+    print(f"Building {len(pending)} icon pyramids ({', '.join(f'{level}px' for level in PYRAMID_LEVELS)})...")
+    with metrics.span("prefetch_pyramids", icons=len(pending)):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+            for url, ok in zip(pending, executor.map(downloader.ensure_pyramid, pending)):
+                if not ok:
+                    failed.add(url)
+    
+    print_cache_stats(downloader)
+    cache_stats = downloader.cache.stats()
+    if cache_stats['evictions']:
+        print("The cache budget was too small to keep every icon; raise it with --cache-max-mb.")
+    print(f"Prefetched {len(urls) - len(failed)} of {len(urls)} icons in {time.time() - start_time:.2f} seconds")
+    return not failed
+
+
+QUERY_FACETS = ("rarity", "type", "set", "series")
+# In-game names of the types, as keys of the category without "Athena".
+QUERY_TYPE_ALIASES = {
+    "outfit": "character",
+    "skin": "character",
+    "backbling": "backpack",
+    "contrail": "skydivecontrail",
+    "emote": "dance",
+    "music": "musicpack",
+    "wrap": "itemwrap",
+}
+
+_query_index = None
+
+
+def load_query_index():
+    # Shared by every Locker in the process: the catalog comes from the
+    # compact file and earlier fuzzy matches from match_cache.json, so
+    # loading another export costs one alias probe per id.
+    global _query_index
+    if _query_index is None:
+        catalog_version, items, aliases = load_cosmetics_catalog()
+        _query_index = CosmeticsIndex(items, match_cache=MatchCache(catalog_version), aliases=aliases)
+    return _query_index
+
+
+def facet_key(facet, value):
+    if value is None:
+        return None
+    key = value.casefold()
+    if facet == "type":
+        # "AthenaCharacter", "Character", "outfit" and "Outfits" name the
+        # same type.
+        key = re.sub(r"[^a-z0-9]", "", key)
+        if key.startswith("athena"):
+            key = key[len("athena"):]
+        if key.endswith("s"):
+            key = key[:-1]
+        key = QUERY_TYPE_ALIASES.get(key, key)
+    return key
+
+
+class Locker:
+    def __init__(self, item_ids, index, name=None):
+        # item_ids maps each category to the ids of its txt file.
+        self.name = name
+        self.index = index
+        self.entries = []
+        for category, ids in item_ids.items():
+            for item_id in ids:
+                item, method = index.resolve(item_id, category)
+                item = item or {}
+                self.entries.append({
+                    "type": category,
+                    "item_id": item_id,
+                    "matched": bool(item),
+                    "method": method,
+                    "id": item.get("id"),
+                    "name": item.get("name"),
+                    "rarity": (item.get("rarity") or {}).get("value"),
+                    "set": (item.get("set") or {}).get("value"),
+                    "series": (item.get("series") or {}).get("value"),
+                })
+        # Positions of the entries for every value of every facet, so a
+        # filter only touches the entries it returns.
+        self.postings = {facet: {} for facet in QUERY_FACETS}
+        for position, entry in enumerate(self.entries):
+            for facet in QUERY_FACETS:
+                self.postings[facet].setdefault(facet_key(facet, entry[facet]), []).append(position)
+    
+    @classmethod
+    def load(cls, output_dir=".", index=None, name=None):
+        item_ids = {}
+        for category in categories:
+            ids = [item_id for item_id in read_category_ids(category, output_dir) or [] if item_id]
+            if ids:
+                item_ids[category] = ids
+        return cls(item_ids, index or load_query_index(), name=name or output_dir)
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def items(self, matched=None, **filters):
+        # Each filter is a value or a list of values, compared
+        # case-insensitively: items(rarity="legendary", type="Character").
+        positions = None
+        for facet, values in filters.items():
+            if facet not in QUERY_FACETS:
+                raise TypeError(f"Unknown filter '{facet}', expected one of: {', '.join(QUERY_FACETS)}")
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            postings = self.postings[facet]
+            selected = {
+                position
+                for value in values
+                for position in postings.get(facet_key(facet, value), ())
+            }
+            positions = selected if positions is None else positions & selected
+        
+        entries = self.entries if positions is None else [self.entries[position] for position in sorted(positions)]
+        if matched is None:
+            return entries
+        return [entry for entry in entries if entry["matched"] == matched]
+    
+    def count(self, by="rarity", matched=None, **filters):
+        if by not in QUERY_FACETS:
+            raise ValueError(f"Cannot count by '{by}', expected one of: {', '.join(QUERY_FACETS)}")
+        counts = {}
+        for entry in self.items(matched=matched, **filters):
+            counts[entry[by]] = counts.get(entry[by], 0) + 1
+        return dict(sorted(counts.items(), key=lambda pair: (-pair[1], str(pair[0]))))
+    
+    def unmatched(self, **filters):
+        return self.items(matched=False, **filters)
+    
+    @staticmethod
+    def entry_key(entry):
+        # Matched items compare by catalog id, so the same item spelled
+        # differently in two exports is not reported as a change.
+        return entry["type"], (entry["id"] or entry["item_id"]).lower()
+    
+    def diff(self, other, **filters):
+        # What changed going from this export to the other one.
+        mine = {self.entry_key(entry): entry for entry in self.items(**filters)}
+        theirs = {self.entry_key(entry): entry for entry in other.items(**filters)}
+        return {
+            "added": [entry for key, entry in theirs.items() if key not in mine],
+            "removed": [entry for key, entry in mine.items() if key not in theirs],
+        }
+
+
+def warm_locker(index, downloader, executor):
+    # Returns a process_pdf callback that matches each record as it is
+    # parsed and starts downloading its icon, so matching and downloads
+    # overlap the rest of the PDF instead of waiting for its last page.
+    seen = set()
+    
+    def on_item(category, item_id):
+        item, _ = index.resolve(item_id, category)
+        if not item or "images" not in item:
+            return
+        url = select_icon_url(item)
+        if url and url not in seen:
+            seen.add(url)
+            executor.submit(downloader.warm, url)
+    
+    return on_item
+
+
+def main(refresh_catalog=False, file_path="EpicGamesAccountData.pdf", password=None, jobs=None,
+         output_dir=".", cache_dir=IMAGE_CACHE_DIR, offline=False, max_cache_bytes=IMAGE_CACHE_MAX_BYTES,
+         output_format="png", background_encode=False, fetch_workers=15):
+    import concurrent.futures
+    
+    opened = open_account_pdf(file_path, password)
+    if opened is None:
+        return
+    file_path, reader, password = opened
+    
+    if not ensure_cosmetics_data(refresh=refresh_catalog, offline=offline):
+        process_pdf(file_path, password, reader=reader, jobs=jobs, output_dir=output_dir)
+        print("Failed to obtain cosmetics data. Cannot create locker image.")
+        return
+    
+    locker_index = load_locker_index()
+    downloader = ImageDownloader(max_workers=fetch_workers, cache_dir=cache_dir, offline=offline,
+                                 max_cache_bytes=max_cache_bytes)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+        process_pdf(file_path, password, reader=reader, jobs=jobs, output_dir=output_dir,
+                    on_item=warm_locker(locker_index[1], downloader, executor))
+    
+    create_locker_image(fetch_workers=fetch_workers, composite_workers=jobs, output_dir=output_dir,
+                        cache_dir=cache_dir, offline=offline, max_cache_bytes=max_cache_bytes,
+                        output_format=output_format, background_encode=background_encode,
+                        locker_index=locker_index, downloader=downloader)
+
+
+def extract_command(args):
+    opened = open_account_pdf(args.pdf, args.password)
+    if opened is None:
+        return False
+    file_path, reader, password = opened
+    return process_pdf(file_path, password, reader=reader, jobs=args.jobs, output_dir=args.output_dir) is not None
+
+
+def fetch_catalog_command(args):
+    if args.no_network:
+        print("fetch-catalog needs the network, but --no-network is set.")
+        return False
+    return download_fortnite_cosmetics(refresh=os.path.exists(CATALOG_FILE))
+
+
+def match_command(args):
+    if not ensure_cosmetics_data(refresh=args.refresh, offline=args.no_network):
+        print("Failed to obtain cosmetics data. Cannot match items.")
+        return False
+    _, index, match_cache = load_locker_index()
+    write_match_report(index, categories, args.output_dir)
+    match_cache.save()
+    return True
+
+
+def render_command(args):
+    if not ensure_cosmetics_data(refresh=args.refresh, offline=args.no_network):
         print("Failed to obtain cosmetics data. Cannot create locker image.")
+        return False
+    create_locker_image(composite_workers=args.jobs, output_dir=args.output_dir, cache_dir=args.cache_dir,
+                        offline=args.no_network, max_cache_bytes=args.cache_max_mb * 1024 * 1024,
+                        output_format=args.format, background_encode=args.background_encode)
+    return True
+
+
+def prefetch_command(args):
+    if args.no_network:
+        print("prefetch needs the network, but --no-network is set.")
+        return False
+    if not ensure_cosmetics_data(refresh=args.refresh):
+        print("Failed to obtain cosmetics data. Cannot prefetch images.")
+        return False
+    return prefetch_icons(types=args.type, rarities=args.rarity, cache_dir=args.cache_dir,
+                          max_cache_bytes=args.cache_max_mb * 1024 * 1024)
+
+
+def print_entries(entries, indent=""):
+    for entry in entries:
+        details = ", ".join(value for value in (entry["rarity"], entry["set"], entry["series"]) if value)
+        label = entry["name"] or "not in catalog"
+        print(f"{indent}{entry['type']:<22} {entry['item_id']:<40} {label}" + (f" ({details})" if details else ""))
+
+
+def query_command(args):
+    # With --json only the result goes to stdout; status lines from loading
+    # the catalog and indexes go to stderr so the output stays parseable.
+    with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+        if not ensure_cosmetics_data(refresh=args.refresh, offline=args.no_network):
+            print("Failed to obtain cosmetics data. Cannot query the locker.")
+            return False
+        
+        index = load_query_index()
+        locker = Locker.load(args.output_dir, index)
+        filters = {facet: getattr(args, facet) for facet in QUERY_FACETS}
+        if args.diff:
+            result = locker.diff(Locker.load(args.diff, index), **filters)
+        elif args.count_by:
+            result = locker.count(args.count_by, **filters)
+        elif args.unmatched:
+            result = locker.unmatched(**filters)
+        else:
+            result = locker.items(**filters)
+        index.match_cache.save()
+    
+    if args.json:
+        print(json.dumps(result, indent=2))
+    elif args.diff:
+        for change in ("added", "removed"):
+            print(f"{change.title()} ({len(result[change])}):")
+            print_entries(result[change], indent="  ")
+    elif args.count_by:
+        for value, count in result.items():
+            print(f"{count:>6}  {value if value is not None else '(none)'}")
+    else:
+        print_entries(result)
+        print(f"{len(result)} of {len(locker)} items")
+    return True
+
+
+def all_command(args):
+    main(refresh_catalog=args.refresh, file_path=args.pdf, password=args.password, jobs=args.jobs,
+         output_dir=args.output_dir, cache_dir=args.cache_dir, offline=args.no_network,
+         max_cache_bytes=args.cache_max_mb * 1024 * 1024, output_format=args.format,
+         background_encode=args.background_encode)
+    return True
+
+
+COMMANDS = {
+    "extract": (extract_command, "extract item ids from the account PDF into per-category txt files"),
+    "fetch-catalog": (fetch_catalog_command, "download or refresh the cosmetics catalog"),
+    "match": (match_command, "match the extracted ids against the catalog and write match_report.json"),
+    "render": (render_command, "render the locker images from the extracted ids"),
+    "prefetch": (prefetch_command, "download catalog icons into the image cache ahead of rendering"),
+    "query": (query_command, "list, count or diff the extracted items without rendering"),
+    "all": (all_command, "extract, fetch the catalog if needed, match and render (the default)"),
+}
+
+
+def add_common_arguments(parser, suppress_defaults=False):
+    # The same options are accepted before and after the command; after it,
+    # they must not overwrite values given before it with their defaults.
+    def default(value):
+        return argparse.SUPPRESS if suppress_defaults else value
+    
+    parser.add_argument("--refresh", action="store_true", default=default(False),
+                        help="refresh the cosmetics catalog before matching or rendering")
+    parser.add_argument("--jobs", type=int, default=default(None),
+                        help="worker processes for PDF extraction, compositing and --batch")
+    parser.add_argument("--cache-dir", default=default(IMAGE_CACHE_DIR),
+                        help=f"image cache directory (default: {IMAGE_CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=int, default=default(IMAGE_CACHE_MAX_BYTES // (1024 * 1024)),
+                        help=f"image cache budget in MB (default: {IMAGE_CACHE_MAX_BYTES // (1024 * 1024)})")
+    parser.add_argument("--no-network", "--offline", dest="no_network", action="store_true", default=default(False),
+                        help="never touch the network: use the local catalog and cached images only")
+    parser.add_argument("--metrics", metavar="PATH", default=default(None),
+                        help="write stage timings, counters and HTTP latency histograms as JSON lines")
+    parser.add_argument("--trace", metavar="PATH", default=default(None),
+                        help="write stage timings as a Chrome trace (chrome://tracing, Perfetto)")
+
+
+def add_output_arguments(parser, suppress_defaults=False):
+    def default(value):
+        return argparse.SUPPRESS if suppress_defaults else value
+    
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default=default("png"),
+                        help="image format for the category grids (default: png; png-fast encodes faster "
+                             "into larger files, webp is usually the smallest and jpeg the fastest)")
+    parser.add_argument("--background-encode", action="store_true", default=default(False),
+                        help="encode images on a background thread when compositing runs in-process "
+                             "(--jobs 0) and for streamed lockers")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Create Fortnite locker images from Epic Games account data.")
+    add_common_arguments(parser)
+    add_output_arguments(parser)
+    parser.add_argument("--batch", metavar="PATH",
+                        help="directory of account PDFs (passwords in passwords.json) or a JSON manifest "
+                             "of {\"pdf\", \"password\", \"name\"} entries")
+    parser.add_argument("--output", default="lockers", help="output root for --batch (default: lockers)")
+    
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    for name, (_, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text, description=help_text)
+        add_common_arguments(subparser, suppress_defaults=True)
+        if name in ("extract", "all"):
+            subparser.add_argument("pdf", nargs="?", default="EpicGamesAccountData.pdf",
+                                   help="account data PDF (default: EpicGamesAccountData.pdf)")
+            subparser.add_argument("--password", help="PDF password; asked for interactively if omitted")
+        if name in ("render", "all"):
+            add_output_arguments(subparser, suppress_defaults=True)
+        if name == "prefetch":
+            subparser.add_argument("--type", action="append", choices=list(categories),
+                                   help="only prefetch this item type (repeatable; default: every rendered type)")
+            subparser.add_argument("--rarity", action="append",
+                                   help="only prefetch this rarity, e.g. legendary (repeatable)")
+        if name == "query":
+            for facet in QUERY_FACETS:
+                subparser.add_argument(f"--{facet}", action="append",
+                                       help=f"only items of this {facet} (repeatable, case-insensitive)")
+            subparser.add_argument("--count-by", choices=QUERY_FACETS, help="count the items per value of a field")
+            subparser.add_argument("--unmatched", action="store_true", help="list the ids missing from the catalog")
+            subparser.add_argument("--diff", metavar="DIR",
+                                   help="compare with another export's --output-dir: items added and removed there")
+            subparser.add_argument("--json", action="store_true", help="print the result as JSON")
+        if name not in ("fetch-catalog", "prefetch"):
+            subparser.add_argument("--output-dir", default=".",
+                                   help="directory for the txt files, images and reports (default: .)")
+    return parser
+
+
+def run_cli(argv=None):
+    args = build_parser().parse_args(argv)
+    
+    try:
+        if args.batch:
+            run_batch(args.batch, output_root=args.output, jobs=args.jobs, refresh_catalog=args.refresh,
+                      cache_dir=args.cache_dir, offline=args.no_network,
+                      max_cache_bytes=args.cache_max_mb * 1024 * 1024, output_format=args.format,
+                      background_encode=args.background_encode)
+            return True
+        if args.command is None:
+            # Plain `python main.py` keeps the original interactive run.
+            main(refresh_catalog=args.refresh, jobs=args.jobs, cache_dir=args.cache_dir,
+                 offline=args.no_network, max_cache_bytes=args.cache_max_mb * 1024 * 1024,
+                 output_format=args.format, background_encode=args.background_encode)
+            return True
+        return COMMANDS[args.command][0](args)
+    finally:
+        if args.metrics:
+            metrics.export_jsonl(args.metrics)
+            print(f"Metrics written to {args.metrics}")
+        if args.trace:
+            metrics.export_chrome_trace(args.trace)
+            print(f"Trace written to {args.trace}")
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(0 if run_cli() else 1)
@@ -0,0 +1,143 @@
+import contextlib
+import gzip
+import http.server
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def catalog_item(item_id, name, rarity="rare"):
+    return {
+        "id": item_id,
+        "name": name,
+        "type": {"value": "outfit", "backendValue": "AthenaCharacter"},
+        "rarity": {"value": rarity},
+        "images": {"icon": f"http://127.0.0.1/{item_id}.png"},
+    }
+
+
+CATALOGS = {
+    "v1": [
+        catalog_item("CID_001_Athena_Commando_F_Default", "Recruit"),
+        catalog_item("CID_002_Athena_Commando_F_Default", "Jonesy"),
+    ],
+    # One item changed its rarity, one was added.
+    "v2": [
+        catalog_item("CID_001_Athena_Commando_F_Default", "Recruit"),
+        catalog_item("CID_002_Athena_Commando_F_Default", "Jonesy", rarity="epic"),
+        catalog_item("CID_003_Athena_Commando_M_Default", "Ramirez"),
+    ],
+}
+
+
+class VersionedCatalogServer:
+    # Serves CATALOGS[version] with an ETag per version and answers a
+    # matching If-None-Match with 304, like fortnite-api.com.
+    def __init__(self):
+        self.version = "v1"
+        self.requests = []
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(dict(self.headers))
+                etag = f'"{stub.version}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                body = json.dumps({"status": 200, "data": CATALOGS[stub.version]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", "Sat, 17 Oct 2026 00:00:00 GMT")
+                if "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v2/cosmetics/br"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class CatalogRefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="catalog_refresh_")
+        self.previous_dir = os.getcwd()
+        os.chdir(self.workdir)
+        self.server = VersionedCatalogServer()
+
+    def tearDown(self):
+        self.server.close()
+        os.chdir(self.previous_dir)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def download(self, refresh):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            ok = main.download_fortnite_cosmetics(refresh=refresh, url=self.server.url)
+        self.assertTrue(ok, output.getvalue())
+        return output.getvalue()
+
+    def load_compact_ids(self):
+        compact = main.load_compact_catalog()
+        self.assertIsNotNone(compact, "the compact catalog is missing or stale")
+        version, items, _ = compact
+        self.assertEqual(version, main.file_sha1(main.CATALOG_FILE))
+        return {item["id"]: item["rarity"]["value"] for item in items}
+
+    def test_conditional_refresh_and_merge(self):
+        self.download(refresh=False)
+        self.assertIn("gzip", self.server.requests[-1].get("Accept-Encoding", ""))
+        self.assertEqual(main.load_catalog_meta()["etag"], '"v1"')
+        self.assertFalse(os.path.exists(main.CATALOG_FILE + ".download"))
+        self.assertEqual(len(self.load_compact_ids()), 2)
+
+        # Nothing changed upstream: the validators come back as a 304 and
+        # the local files are left alone.
+        with open(main.CATALOG_FILE, "rb") as f:
+            catalog_before = f.read()
+        output = self.download(refresh=True)
+        self.assertEqual(self.server.requests[-1].get("If-None-Match"), '"v1"')
+        self.assertEqual(self.server.requests[-1].get("If-Modified-Since"), "Sat, 17 Oct 2026 00:00:00 GMT")
+        self.assertIn("already up to date", output)
+        with open(main.CATALOG_FILE, "rb") as f:
+            self.assertEqual(f.read(), catalog_before)
+
+        # A new version is merged into the local catalog and the compact
+        # file is rebuilt from it.
+        self.server.version = "v2"
+        output = self.download(refresh=True)
+        self.assertEqual(self.server.requests[-1].get("If-None-Match"), '"v1"')
+        self.assertIn("Catalog refresh: 1 new, 1 changed items", output)
+        self.assertEqual(main.load_catalog_meta()["etag"], '"v2"')
+        self.assertEqual(self.load_compact_ids(), {
+            "CID_001_Athena_Commando_F_Default": "rare",
+            "CID_002_Athena_Commando_F_Default": "epic",
+            "CID_003_Athena_Commando_M_Default": "rare",
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()